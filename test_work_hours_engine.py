@@ -0,0 +1,406 @@
+"""Vérifications du calcul vectorisé de work_hours_engine (pauses, majorations) par comparaison avec un calcul minute par minute
+
+    python -m pytest test_work_hours_engine.py
+    python -m unittest test_work_hours_engine
+"""
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from work_hours_engine import (NO_BREAK, EntryStore, JournalStorage, SqliteStorage, TariffTable, WorkHoursEngine,
+                               anchor_breaks, break_union_minutes, break_union_pieces, compute_duration_minutes,
+                               compute_durations, duration_minutes, format_date, open_storage, to_epoch_minutes)
+
+# Lundi 15/01/2024 00:00, en minutes depuis le 01/01/1970
+MONDAY = to_epoch_minutes("2024-01-15", "00:00")
+
+
+def random_periods(rng, count):
+    """Périodes et pauses aléatoires : pauses qui se recouvrent, passent minuit ou débordent de la période"""
+    starts, ends, owners, break_starts, break_ends = [], [], [], [], []
+    for index in range(count):
+        start = MONDAY + rng.randrange(0, 14 * 1440)
+        # Quelques durées nulles, négatives ou de plus de 24h
+        end = start + rng.choice([rng.randrange(1, 24 * 60 + 1), 0, -rng.randrange(1, 600),
+                                  24 * 60 + rng.randrange(1, 600)])
+        starts.append(start)
+        ends.append(end)
+        for _ in range(rng.choice([0, 0, 1, 1, 2, 3, 5])):
+            break_start = start + rng.randrange(-120, max(end - start, 0) + 120)
+            owners.append(index)
+            break_starts.append(break_start)
+            break_ends.append(break_start + rng.randrange(-30, 240))
+    return tuple(np.array(values, dtype=np.int64) for values in (starts, ends, owners, break_starts, break_ends))
+
+
+def brute_break_minutes(start, end, breaks):
+    """Minutes de la période couvertes par au moins une pause"""
+    covered = set()
+    for break_start, break_end in breaks:
+        covered.update(range(max(break_start, start), min(break_end, end)))
+    return covered
+
+
+class BreakUnionTest(unittest.TestCase):
+    """Union des pauses par maximum cumulé décalé par période"""
+
+    def test_union_matches_minute_sets(self):
+        rng = random.Random(5)
+        starts, ends, owners, break_starts, break_ends = random_periods(rng, 400)
+        union = break_union_minutes(starts, ends, owners, break_starts, break_ends)
+        for index in range(len(starts)):
+            breaks = list(zip(break_starts[owners == index], break_ends[owners == index]))
+            expected = len(brute_break_minutes(int(starts[index]), int(ends[index]), breaks))
+            self.assertEqual(union[index], expected, f"période {index}")
+
+    def test_pieces_are_disjoint_and_cover_the_union(self):
+        rng = random.Random(2)
+        starts, ends, owners, break_starts, break_ends = random_periods(rng, 300)
+        piece_owners, piece_starts, piece_ends = break_union_pieces(starts, ends, owners, break_starts, break_ends)
+        for index in range(len(starts)):
+            mine = piece_owners == index
+            covered = []
+            for piece_start, piece_end in zip(piece_starts[mine], piece_ends[mine]):
+                self.assertLessEqual(piece_start, piece_end)
+                self.assertGreaterEqual(piece_start, starts[index])
+                if piece_end > piece_start:
+                    self.assertLessEqual(piece_end, ends[index])
+                covered.extend(range(piece_start, piece_end))
+            self.assertEqual(len(covered), len(set(covered)), f"morceaux qui se recouvrent, période {index}")
+            breaks = list(zip(break_starts[owners == index], break_ends[owners == index]))
+            self.assertEqual(set(covered), brute_break_minutes(int(starts[index]), int(ends[index]), breaks))
+
+    def test_no_breaks(self):
+        starts = np.array([MONDAY], dtype=np.int64)
+        empty = np.zeros(0, dtype=np.int64)
+        self.assertEqual(break_union_minutes(starts, starts + 60, empty, empty, empty).tolist(), [0])
+
+    def test_durations_match_scalar_computation(self):
+        rng = random.Random(11)
+        starts, ends, owners, break_starts, break_ends = random_periods(rng, 400)
+        minutes = duration_minutes(starts, ends, owners, break_starts, break_ends)
+        for index in range(len(starts)):
+            breaks = list(zip(break_starts[owners == index].tolist(), break_ends[owners == index].tolist()))
+            raw = int(ends[index] - starts[index])
+            worked = 0 if raw < 0 or raw > 24 * 60 else raw - len(
+                brute_break_minutes(int(starts[index]), int(ends[index]), breaks))
+            self.assertEqual(minutes[index], max(worked, 0), f"période {index}")
+            self.assertEqual(minutes[index], compute_duration_minutes(int(starts[index]), int(ends[index]), breaks))
+
+
+class MultipleBreaksTest(unittest.TestCase):
+    """Pauses multiples d'une entrée : datation, stockage et durées en lot"""
+
+    def test_anchor_breaks_across_midnight(self):
+        # Travail de nuit : une pause avant minuit, une à cheval, une après minuit
+        breaks = anchor_breaks("2024-01-15", "22:00", [("23:00", "23:15"), ("23:50", "00:10"), ("02:00", "02:30")])
+        self.assertEqual(breaks, [["2024-01-15 23:00", "2024-01-15 23:15"],
+                                  ["2024-01-15 23:50", "2024-01-16 00:10"],
+                                  ["2024-01-16 02:00", "2024-01-16 02:30"]])
+
+    def test_store_durations_match_brute_force(self):
+        rng = random.Random(3)
+        store = EntryStore(["Travail"])
+        expected = []
+        for _ in range(200):
+            start = MONDAY + rng.randrange(0, 14 * 1440)
+            end = start + rng.randrange(30, 16 * 60)
+            breaks = []
+            for _ in range(rng.choice([0, 1, 2, 3])):
+                break_start = rng.randrange(start, end)
+                breaks.append((break_start, break_start + rng.randrange(1, 120)))
+            store.append_row(None, start, end, sorted(breaks), "Travail")
+            expected.append(end - start - len(brute_break_minutes(start, end, breaks)))
+        self.assertEqual(list(store.minutes), expected)
+        hours, _, _ = compute_durations(store)
+        np.testing.assert_allclose(hours, np.round(np.array(expected) / 60, 2))
+
+    def test_round_trip_keeps_every_break(self):
+        store = EntryStore(["Travail"])
+        entry = {'id': 7, 'start_date': "2024-01-15", 'start_time': "22:00", 'end_date': "2024-01-16",
+                 'end_time': "06:00", 'category': "Travail",
+                 'breaks': anchor_breaks("2024-01-15", "22:00", [("23:00", "23:30"), ("02:00", "02:45")])}
+        store.append(entry)
+        self.assertEqual(store.break_starts[0], to_epoch_minutes("2024-01-15", "23:00"))
+        self.assertNotEqual(store.break_ends[0], NO_BREAK)
+        copy = EntryStore.from_dicts(store.to_list(), ["Travail"])
+        self.assertEqual(copy.breaks(0), store.breaks(0))
+        self.assertEqual(copy.minutes[0], 8 * 60 - 75)
+
+    def test_legacy_single_break_round_trip(self):
+        entry = {'id': 1, 'start_date': "2024-01-15", 'start_time': "08:00", 'end_date': "2024-01-15",
+                 'end_time': "17:00", 'category': "Travail", 'has_break': True, 'break_start_hour': "12",
+                 'break_start_min': "00", 'break_end_hour': "13", 'break_end_min': "00"}
+        store = EntryStore.from_dicts([entry], ["Travail"])
+        self.assertEqual(store.to_list(), [entry])
+        self.assertEqual(store.minutes[0], 8 * 60)
+
+    def test_legacy_unreadable_break_is_ignored_and_kept(self):
+        # Enregistrement des anciennes versions : case de pause cochée, un champ laissé vide
+        entry = {'id': 1, 'start_date': "2024-01-15", 'start_time': "08:00", 'end_date': "2024-01-15",
+                 'end_time': "17:00", 'category': "Travail", 'has_break': True, 'break_start_hour': "",
+                 'break_start_min': "00", 'break_end_hour': "13", 'break_end_min': "00"}
+        store = EntryStore.from_dicts([entry], ["Travail"])
+        self.assertEqual(store.rejected, [])
+        self.assertEqual(store.minutes[0], 9 * 60)
+        self.assertEqual(store.to_list(), [entry])
+        # Les pauses suivent une modification des heures ; une nouvelle pause remplace les champs illisibles
+        store.update(0, {'end_time': "18:00"})
+        self.assertEqual(store.to_dict(0)['break_start_hour'], "")
+        store.update(0, {'break_start_hour': "12"})
+        self.assertEqual(store.minutes[0], 9 * 60)
+        self.assertEqual(store.to_dict(0)['break_start_hour'], "12")
+
+
+def brute_rate(rules):
+    """Coefficient de majoration de chaque minute, règle par règle (fonction des minutes depuis le 01/01/1970)"""
+    night_start = to_epoch_minutes("1970-01-01", rules['night_start'])
+    night_end = to_epoch_minutes("1970-01-01", rules['night_end'])
+    holidays = {to_epoch_minutes(day, "00:00") // 1440 for day in rules['holidays']}
+
+    def rate(moment):
+        minute = moment % 1440
+        if night_start <= night_end:
+            night = night_start <= minute < night_end
+        else:
+            night = minute >= night_start or minute < night_end
+        # Le 01/01/1970 était un jeudi (lundi : 0)
+        weekday = (moment // 1440 + 3) % 7
+        value = max(1.0, rules['night_multiplier'] if night else 1.0,
+                    rules['weekend_multiplier'] if weekday in rules['weekend_days'] else 1.0)
+        if moment // 1440 in holidays:
+            value = max(value, rules['holiday_multiplier'])
+        return value
+    return rate
+
+
+def random_rules(rng):
+    night_start, night_end = rng.sample(range(0, 1440, 15), 2)
+    first_holiday = rng.randrange(0, 12)
+    return {
+        'night_start': f"{night_start // 60:02d}:{night_start % 60:02d}",
+        'night_end': f"{night_end // 60:02d}:{night_end % 60:02d}",
+        'night_multiplier': rng.choice([0.5, 1.25, 1.5]),
+        'weekend_days': rng.sample(range(7), rng.randrange(0, 4)),
+        'weekend_multiplier': rng.choice([1.0, 1.5, 2.0]),
+        # Jours fériés isolés et consécutifs : un intervalle de 24h peut en toucher deux
+        'holidays': [format_date(MONDAY + (first_holiday + offset) * 1440) for offset in (0, 1, 5)],
+        'holiday_multiplier': rng.choice([1.75, 2.0, 3.0]),
+        'overtime_hours': rng.choice([0, 4.5, 8.0]),
+        'overtime_multiplier': rng.choice([1.25, 1.5]),
+    }
+
+
+class OverlapIndexTest(unittest.TestCase):
+    """Recherche des entrées qui chevauchent une période (index chronologique borné par max_span)"""
+
+    def brute_overlapping(self, store, start, end):
+        return sorted((key for i, key in enumerate(store.keys) if store.starts[i] < end and store.ends[i] > start),
+                      key=lambda key: (store.starts[store._positions[key]], key))
+
+    def test_max_span_shrinks_when_the_longest_entry_goes(self):
+        rng = random.Random(5)
+        store = EntryStore(["Travail"])
+        for _ in range(300):
+            start = MONDAY + rng.randrange(0, 60 * 1440)
+            store.append_row(None, start, start + rng.randrange(30, 10 * 60), [], "Travail")
+        short_span = store.max_span
+        long_entry = store.append_row(None, MONDAY, MONDAY + 30 * 1440, [], "Travail")
+        other_long = store.append_row(None, MONDAY + 1440, MONDAY + 20 * 1440, [], "Travail")
+        self.assertEqual(store.max_span, 30 * 1440)
+        # Raccourcie puis supprimée : la borne suit l'entrée la plus longue restante
+        store.update(long_entry.index, {'end_date': "2024-01-15", 'end_time': "01:00"})
+        self.assertEqual(store.max_span, 19 * 1440)
+        store.remove_keys([store.keys[other_long.index]])
+        self.assertEqual(store.max_span, short_span)
+        for _ in range(200):
+            start = MONDAY + rng.randrange(-1440, 61 * 1440)
+            end = start + rng.randrange(1, 3 * 1440)
+            self.assertEqual(store.overlapping(start, end), self.brute_overlapping(store, start, end))
+        store.clear()
+        self.assertEqual(store.max_span, 0)
+
+
+class TariffTableTest(unittest.TestCase):
+    """Table des majorations par minute de la semaine et sommes cumulées"""
+
+    def test_weigh_matches_minute_by_minute(self):
+        rng = random.Random(5)
+        for _ in range(10):
+            rules = random_rules(rng)
+            table = TariffTable(rules)
+            rate = brute_rate(rules)
+            starts = np.array([MONDAY + rng.randrange(0, 14 * 1440) for _ in range(150)], dtype=np.int64)
+            ends = starts + np.array([rng.randrange(0, 24 * 60 + 1) for _ in range(150)], dtype=np.int64)
+            weights = table.weigh(starts, ends)
+            for start, end, weight in zip(starts.tolist(), ends.tolist(), weights):
+                expected = sum(rate(moment) for moment in range(start, end))
+                self.assertAlmostEqual(weight, expected, delta=1e-6, msg=f"{rules} {start} {end}")
+
+    def test_weighted_minutes_match_minute_by_minute(self):
+        rng = random.Random(2)
+        for _ in range(5):
+            rules = random_rules(rng)
+            table = TariffTable(rules)
+            rate = brute_rate(rules)
+            starts, ends, owners, break_starts, break_ends = random_periods(rng, 200)
+            minutes = duration_minutes(starts, ends, owners, break_starts, break_ends)
+            weights = table.weighted_minutes(starts, ends, minutes, owners, break_starts, break_ends)
+            overtime = round(rules['overtime_hours'] * 60)
+            for index in range(len(starts)):
+                start, end = int(starts[index]), int(ends[index])
+                expected = 0.0
+                if minutes[index] > 0:
+                    breaks = list(zip(break_starts[owners == index], break_ends[owners == index]))
+                    paused = brute_break_minutes(start, end, breaks)
+                    expected = sum(rate(moment) for moment in range(start, end) if moment not in paused)
+                    if overtime > 0:
+                        expected += (rules['overtime_multiplier'] - 1) * max(int(minutes[index]) - overtime, 0)
+                self.assertAlmostEqual(weights[index], expected, delta=1e-6, msg=f"période {index}")
+
+    def test_amounts_use_weighted_hours(self):
+        rules = dict(random_rules(random.Random(8)), weekend_days=[5, 6], weekend_multiplier=1.5,
+                     holidays=[], night_multiplier=1.0, overtime_hours=0)
+        store = EntryStore(["Travail"])
+        # Samedi 20/01/2024, 8h sans pause
+        store.append({'start_date': "2024-01-20", 'start_time': "08:00", 'end_date': "2024-01-20",
+                      'end_time': "16:00", 'category': "Travail"})
+        hours, amounts, _ = compute_durations(store, 10.0, TariffTable(rules))
+        self.assertEqual(hours.tolist(), [8.0])
+        self.assertAlmostEqual(amounts[0], 8 * 1.5 * 10.0)
+
+    def test_invalid_rules_are_named(self):
+        with self.assertRaisesRegex(ValueError, "nuit"):
+            TariffTable(dict(random_rules(random.Random(1)), night_start="25:00"))
+        with self.assertRaisesRegex(ValueError, "férié"):
+            TariffTable(dict(random_rules(random.Random(1)), holidays=["2024-02-30"]))
+
+
+def make_entry(day, start_time="08:00", end_time="12:00", category="Travail normal"):
+    return {'start_date': day, 'start_time': start_time, 'end_date': day, 'end_time': end_time,
+            'category': category}
+
+
+class StorageTest(unittest.TestCase):
+    """Journal, instantané JSON et base SQLite"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.directory.name, 'work_hours_data')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def first_session(self, days):
+        """Session sans compaction : les entrées ne sont que dans le journal"""
+        engine = WorkHoursEngine(storage=JournalStorage(self.base + '.json'))
+        engine.start()
+        for day in days:
+            self.assertTrue(engine.add_entry(make_entry(day))[0])
+        engine.close()
+        return engine
+
+    def test_journal_is_replayed(self):
+        self.first_session(["2024-01-15", "2024-01-16"])
+        self.assertFalse(os.path.exists(self.base + '.json'))
+        engine = WorkHoursEngine(storage=JournalStorage(self.base + '.json'))
+        engine.load()
+        self.assertEqual(len(engine.entries), 2)
+        self.assertEqual(engine.total_hours(), 8.0)
+
+    def test_sqlite_migration_reads_the_journal(self):
+        self.first_session(["2024-01-15", "2024-01-16", "2024-01-17"])
+        with mock.patch.dict(os.environ, {'WORK_HOURS_STORAGE': 'sqlite'}):
+            storage = open_storage(self.base)
+        self.assertIsInstance(storage, SqliteStorage)
+        engine = WorkHoursEngine(storage=storage)
+        engine.load()
+        self.assertEqual(sorted(engine.entries.ids), [0, 1, 2])
+        self.assertEqual(engine.total_hours(), 12.0)
+        storage.close()
+
+    def test_read_only_database_is_not_modified(self):
+        storage = SqliteStorage(self.base + '.db')
+        engine = WorkHoursEngine(storage=storage)
+        engine.start()
+        engine.add_entry(make_entry("2024-01-15"))
+        engine.close()
+        storage.close()
+        with open(self.base + '.db', 'rb') as f:
+            content = f.read()
+        storage = SqliteStorage(self.base + '.db', read_only=True)
+        engine = WorkHoursEngine(storage=storage)
+        engine.load()
+        self.assertEqual(engine.total_hours(), 4.0)
+        with self.assertRaises(RuntimeError):
+            storage.append([{'op': 'clear'}])
+        storage.close()
+        with open(self.base + '.db', 'rb') as f:
+            self.assertEqual(f.read(), content)
+
+
+class ImportTest(unittest.TestCase):
+    """Import CSV en lot : mêmes règles que la saisie"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = WorkHoursEngine(storage=JournalStorage(os.path.join(self.directory.name, 'data.json')))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def import_rows(self, *lines, header="Date;Heure début;Début pause;Fin pause;Heure fin;Catégorie"):
+        path = os.path.join(self.directory.name, 'import.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join((header,) + lines) + "\n")
+        return self.engine.import_csv(path)
+
+    def test_accepted_rows(self):
+        count, rejected = self.import_rows(
+            "2024-01-15;08:00;12:00;12:30;17:00;Travail normal",
+            # Date sans zéros, acceptée par verify_duration
+            "2024-1-16;8:00;;;12:00;",
+            # Travail de nuit sans date de fin, pauses multiples de l'export
+            "2024-01-17;22:00;23:00, 02:00;23:30, 02:15;06:00;travail de nuit",
+            # Ligne des totaux d'un export et ligne vide : ignorées
+            ";;;;;Total",
+            "")
+        self.assertEqual((count, rejected), (3, []))
+        entries = self.engine.entries
+        self.assertEqual(entries.to_dict(1)['start_date'], "2024-01-16")
+        self.assertEqual(list(entries.minutes), [8 * 60 + 30, 4 * 60, 8 * 60 - 45])
+        self.assertEqual(entries.to_dict(2)['end_date'], "2024-01-18")
+        self.assertEqual(entries.categories[entries.category_codes[2]], "Travail de nuit")
+
+    def test_rejected_rows(self):
+        count, rejected = self.import_rows(
+            "2024-13-01;08:00;;;12:00;",
+            "15/01/2024;08:00;;;12:00;",
+            "2024-01-15;25:00;;;12:00;",
+            "2024-01-15;08:00;12:00;;17:00;",
+            "2024-01-15;08:00;12:00, 13:00;12:30;17:00;",
+            "2024-01-15;08:00;;;17:00;Inconnue",
+            "2024-01-15;08:00;;;08:00;",
+            header="Date;Heure début;Début pause;Fin pause;Heure fin;Catégorie")
+        self.assertEqual(count, 0)
+        self.assertEqual(rejected, [
+            (2, "Format de date/heure invalide"),
+            (3, "Format de date/heure invalide"),
+            (4, "Format de date/heure invalide"),
+            (5, "Heures de pause invalides"),
+            (6, "Heures de pause invalides"),
+            (7, "Catégorie inconnue (Inconnue)"),
+            (8, "La durée doit être supérieure à 0"),
+        ])
+
+    def test_missing_columns(self):
+        with self.assertRaisesRegex(ValueError, "Colonnes manquantes"):
+            self.import_rows("2024-01-15;08:00", header="Date;Heure début")
+
+
+if __name__ == "__main__":
+    unittest.main()
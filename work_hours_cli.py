@@ -0,0 +1,131 @@
+"""Traitement en lot des fichiers d'heures, sans interface graphique
+
+Exemples :
+    python work_hours_cli.py totals work_hours_data.json --start 2024-01-01 --end 2024-01-31
+    python work_hours_cli.py verify equipe/*.json --json
+    python work_hours_cli.py export work_hours_data.json --format csv -o janvier.csv
+    python work_hours_cli.py export work_hours_data.json --format xlsx --group-by catégorie
+
+N'importe que work_hours_engine (ni tkinter ni matplotlib, sauf pour l'export PNG).
+Code de sortie : 0 si tout va bien, 1 si verify détecte des problèmes, 2 en cas d'erreur.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+from work_hours_engine import (PNG_DPI, XLSX_GROUPS, JournalStorage, SqliteStorage, WorkHoursEngine,
+                               write_csv, write_pdf, write_png, write_xlsx)
+
+WRITERS = {'csv': write_csv, 'pdf': write_pdf, 'png': write_png, 'xlsx': write_xlsx}
+
+
+def open_engine(path, args):
+    """Charge un fichier de données (.json ou .db) et applique les filtres de la ligne de commande"""
+    if path.endswith('.db'):
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        # Lecture seule : ni mode WAL ni création de table sur la base de l'utilisateur
+        storage = SqliteStorage(path, read_only=True)
+    else:
+        storage = JournalStorage(path)
+    # Le thread d'écriture n'est pas démarré : les fichiers ne sont jamais modifiés
+    engine = WorkHoursEngine(storage=storage)
+    engine.set_date_filter(args.start or '', args.end or '')
+    engine.set_category_filter(args.category)
+    # Base SQLite : seule la période demandée est lue (requête sur les index)
+    engine.load(period=engine.date_filter)
+    return engine
+
+
+def command_totals(engine, path, args):
+    """Heures et montants des entrées filtrées"""
+    summary = dict(engine.summary(), file=path)
+    if not args.json:
+        print(f"{path}\t{summary['entries']}\t{summary['hours']:.2f}\t{summary['amount']:.2f}")
+        for category, hours in summary['categories'].items():
+            print(f"{path}\t{category}\t{hours:.2f}")
+    return summary, 0
+
+
+def command_verify(engine, path, args):
+    """Anomalies de durée des entrées filtrées"""
+    total_duration, issues = engine.check_durations(engine.active_positions())
+    result = {'file': path, 'hours': round(total_duration, 2), 'issues': issues}
+    if not args.json:
+        for issue in issues:
+            print(f"{path}\t{issue}")
+        print(f"{path}\t{len(issues)} problème(s)\t{total_duration:.2f}h")
+    return result, 1 if issues else 0
+
+
+def command_export(engine, path, args):
+    """Export des entrées filtrées en CSV, PDF, PNG ou XLSX"""
+    if args.output and len(args.files) == 1:
+        output = args.output
+    else:
+        output = os.path.splitext(path)[0] + '.' + args.format
+    pipeline = engine.export_pipeline(args.columns or WorkHoursEngine.EXPORT_COLUMNS,
+                                      numeric=args.format == 'xlsx')
+    options = {}
+    if args.format == 'png':
+        options['dpi'] = args.dpi
+    elif args.format == 'xlsx':
+        options['group_by'] = args.group_by
+    WRITERS[args.format](output, pipeline, **options)
+    if not args.json:
+        print(f"{path}\t{output}\t{pipeline.written}")
+    return {'file': path, 'output': output, 'rows': pipeline.written}, 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Calcul des heures travaillées en ligne de commande")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('files', nargs='+', help="fichiers de données (.json ou .db)")
+    common.add_argument('--start', help="date de début incluse (AAAA-MM-JJ)")
+    common.add_argument('--end', help="date de fin incluse (AAAA-MM-JJ)")
+    common.add_argument('--category', action='append', help="catégorie à retenir (option répétable)")
+    common.add_argument('--json', action='store_true', help="résultat en JSON sur la sortie standard")
+
+    commands = parser.add_subparsers(dest='command', required=True)
+    totals = commands.add_parser('totals', parents=[common], help="total des heures et des montants")
+    totals.set_defaults(handler=command_totals)
+    verify = commands.add_parser('verify', parents=[common], help="vérification des durées")
+    verify.set_defaults(handler=command_verify)
+    export = commands.add_parser('export', parents=[common], help="export des entrées")
+    export.add_argument('--format', choices=sorted(WRITERS), default='csv')
+    export.add_argument('-o', '--output', help="fichier produit (un seul fichier d'entrée)")
+    export.add_argument('--dpi', type=int, default=PNG_DPI,
+                        help="résolution des images PNG (une image par page : rapport_001.png, ...)")
+    export.add_argument('--group-by', choices=XLSX_GROUPS, default=XLSX_GROUPS[0],
+                        help="XLSX : une feuille par mois ou par catégorie")
+    export.add_argument('--columns', nargs='+', choices=WorkHoursEngine.EXPORT_COLUMNS,
+                        help="colonnes à exporter (toutes par défaut)")
+    export.set_defaults(handler=command_export)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Avertissements du moteur (entrées illisibles...) sur la sortie d'erreur : stdout ne porte que les résultats
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING, format="%(levelname)s: %(message)s")
+    results = []
+    status = 0
+    for path in args.files:
+        try:
+            engine = open_engine(path, args)
+            result, code = args.handler(engine, path, args)
+        except Exception as e:
+            result, code = {'file': path, 'error': str(e)}, 2
+            print(f"{path}: erreur : {e}", file=sys.stderr)
+        results.append(result)
+        status = max(status, code)
+    if args.json:
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2379 @@
+"""Moteur de calcul des heures travaillées, sans interface graphique
+
+Ce module regroupe les entrées, le calcul et la vérification des durées, les taux
+par catégorie, le chargement/la sauvegarde et la préparation des lignes d'export.
+Il n'importe ni tkinter ni matplotlib : il peut être utilisé sur un serveur sans
+affichage, et WorkHoursApp (work_hours_improved.py) n'en est qu'une interface.
+"""
+from datetime import datetime, date
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+import os
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import numpy as np
+
+# Diagnostics du moteur : jamais sur la sortie standard, réservée aux données (ligne de commande)
+logger = logging.getLogger(__name__)
+
+# Référence pour la conversion des dates en minutes entières
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Valeur sentinelle des colonnes de pause pour une entrée sans pause
+NO_BREAK = -(2 ** 63)
+
+# Anomalies signalées par compute_durations (masque de bits)
+DURATION_INVALID = 1     # Durée brute nulle ou négative
+DURATION_TOO_LONG = 2    # Durée brute supérieure à 24h
+DURATION_EMPTY = 4       # Durée finale nulle après déduction de la pause
+BREAK_TOO_LONG = 8       # Plus de 2h d'écart entre durée brute et durée finale
+
+# Regroupements des totaux par période tenus à jour par EntryStore
+ROLLUP_GRANULARITIES = ('jour', 'semaine', 'mois')
+
+# Table des majorations : une valeur par minute de la semaine, du lundi 00:00 au dimanche 23:59
+MINUTES_PER_WEEK = 7 * 24 * 60
+# Le 01/01/1970 était un jeudi : décalage pour ramener la minute 0 de la semaine au lundi
+WEEK_OFFSET = 3 * 24 * 60
+
+def to_epoch_minutes(date_str, time_str):
+    """Convertit une date (AAAA-MM-JJ) et une heure (HH:MM) en minutes depuis le 01/01/1970"""
+    moment = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+    return (moment.toordinal() - EPOCH_ORDINAL) * 1440 + moment.hour * 60 + moment.minute
+
+def format_date(minutes):
+    """Convertit des minutes depuis le 01/01/1970 en date AAAA-MM-JJ"""
+    return date.fromordinal(EPOCH_ORDINAL + minutes // 1440).isoformat()
+
+def format_time(minutes):
+    """Convertit des minutes depuis le 01/01/1970 en heure HH:MM"""
+    minutes %= 1440
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def compute_duration_minutes(start, end, breaks=()):
+    """Calcule la durée de travail en minutes entières, pauses déduites
+    
+    breaks : liste de pauses (début, fin) en minutes depuis le 01/01/1970.
+    """
+    # Fin antérieure au début ou durée supérieure à 24h : durée nulle
+    if end < start or end - start > 24 * 60:
+        return 0
+    # Soustraire l'union des pauses comprises dans la période de travail, en une passe
+    # sur les pauses triées : chaque minute de pause n'est comptée qu'une fois
+    duration = end - start
+    covered = start
+    for break_start, break_end in sorted(breaks):
+        break_start = max(break_start, covered)
+        break_end = min(break_end, end)
+        if break_end > break_start:
+            duration -= break_end - break_start
+            covered = break_end
+    return duration
+
+def parse_break_ranges(text):
+    """Lit des pauses saisies sous la forme « HH:MM-HH:MM, HH:MM-HH:MM » ; lève ValueError"""
+    ranges = []
+    for item in text.replace(';', ',').split(','):
+        if not item.strip():
+            continue
+        try:
+            start_time, end_time = (part.strip() for part in item.split('-'))
+            for value in (start_time, end_time):
+                datetime.strptime(value, "%H:%M")
+        except ValueError:
+            raise ValueError(f"Pause invalide : {item.strip()} (HH:MM-HH:MM attendu)")
+        ranges.append((start_time, end_time))
+    return ranges
+
+def anchor_breaks(start_date, start_time, ranges):
+    """Date des pauses (HH:MM, HH:MM) d'une période commençant le start_date à start_time
+    
+    Chaque pause est rattachée à la date de début et se termine après son début (le lendemain
+    si elle passe minuit) ; une pause qui finit avant le début de la période est reportée au
+    lendemain (pause après minuit d'un travail de nuit).
+    Retourne les pauses au format enregistré : [["AAAA-MM-JJ HH:MM", "AAAA-MM-JJ HH:MM"], ...].
+    """
+    try:
+        start = to_epoch_minutes(start_date, start_time)
+    except ValueError as e:
+        raise ValueError(f"Format de date/heure invalide: {str(e)}")
+    day = start - start % 1440
+    breaks = []
+    for break_start_time, break_end_time in ranges:
+        break_start = day + to_epoch_minutes("1970-01-01", break_start_time)
+        break_end = day + to_epoch_minutes("1970-01-01", break_end_time)
+        if break_end < break_start:
+            break_end += 1440
+        if break_end <= start:
+            break_start += 1440
+            break_end += 1440
+        breaks.append([f"{format_date(moment)} {format_time(moment)}" for moment in (break_start, break_end)])
+    return breaks
+
+def to_centihours(minutes):
+    """Convertit une durée en minutes en centièmes d'heure (durée arrondie à 2 décimales)"""
+    return round(minutes * 100 / 60)
+
+def period_start(day, granularity):
+    """Retourne le premier jour (jours depuis le 01/01/1970) du jour, de la semaine ISO ou du mois de day"""
+    if granularity == 'semaine':
+        # Le 01/01/1970 était un jeudi : lundi = 0
+        return day - (day + 3) % 7
+    if granularity == 'mois':
+        return day - date.fromordinal(EPOCH_ORDINAL + day).day + 1
+    return day
+
+def period_starts(days, granularity):
+    """Version vectorisée de period_start pour un tableau NumPy de jours"""
+    if granularity == 'semaine':
+        return days - (days + 3) % 7
+    if granularity == 'mois':
+        return days.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    return days
+
+def break_union_pieces(starts, ends, owners, break_starts, break_ends):
+    """Découpe l'union des pauses de chaque période en morceaux disjoints (owners : indice de la période de chaque pause)
+    
+    Les pauses sont triées par période puis par début et ramenées à leur période ; un maximum
+    cumulé décalé par période (chaque période occupe sa propre plage de valeurs) donne la fin
+    déjà couverte avant chaque pause, si bien que l'union se calcule en une seule passe.
+    Retourne la période, le début et la fin (minutes depuis le 01/01/1970) de chaque morceau,
+    éventuellement vide.
+    """
+    if not len(owners):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    order = np.lexsort((break_starts, owners))
+    owners = owners[order]
+    origins = starts[owners]
+    lengths = np.clip(ends[owners] - origins, 0, None)
+    clipped_starts = np.clip(break_starts[order] - origins, 0, lengths)
+    clipped_ends = np.maximum(np.clip(break_ends[order] - origins, 0, lengths), clipped_starts)
+    
+    # Fin couverte par les pauses précédentes de la même période (0 pour la première)
+    offsets = owners * (int(lengths.max()) + 1)
+    reach = np.maximum.accumulate(clipped_ends + offsets)
+    covered = np.concatenate(([0], reach[:-1])) - offsets
+    covered = np.clip(covered, 0, None)
+    piece_starts = np.maximum(clipped_starts, covered)
+    piece_ends = np.maximum(clipped_ends, piece_starts)
+    return owners, origins + piece_starts, origins + piece_ends
+
+def break_union_minutes(starts, ends, owners, break_starts, break_ends):
+    """Minutes de pause de chaque période : longueur de l'union de ses pauses (voir break_union_pieces)"""
+    owners, piece_starts, piece_ends = break_union_pieces(starts, ends, owners, break_starts, break_ends)
+    return np.bincount(owners, weights=piece_ends - piece_starts, minlength=len(starts)).astype(np.int64)
+
+def duration_minutes(starts, ends, owners, break_starts, break_ends):
+    """Version vectorisée de compute_duration_minutes pour des tableaux NumPy (minutes entières)
+    
+    Les pauses sont données à plat : owners indique la période de chaque pause.
+    """
+    # Durée brute, annulée si la fin précède le début ou si elle dépasse 24h
+    raw = ends - starts
+    minutes = np.where((raw < 0) | (raw > 24 * 60), 0, raw)
+    return minutes - np.minimum(break_union_minutes(starts, ends, owners, break_starts, break_ends), minutes)
+
+def longest_increasing_subsequence(values):
+    """Retourne l'ensemble des valeurs d'une plus longue sous-suite strictement croissante"""
+    # tail_values[k] : plus petite fin d'une sous-suite de longueur k + 1 (indice dans tails)
+    tail_values = []
+    tails = []
+    previous = [-1] * len(values)
+    for i, value in enumerate(values):
+        length = bisect_left(tail_values, value)
+        if length:
+            previous[i] = tails[length - 1]
+        if length == len(tails):
+            tail_values.append(value)
+            tails.append(i)
+        else:
+            tail_values[length] = value
+            tails[length] = i
+    result = set()
+    i = tails[-1] if tails else -1
+    while i >= 0:
+        result.add(values[i])
+        i = previous[i]
+    return result
+
+
+class EntryView:
+    """Vue compatible dict sur une ligne d'un EntryStore"""
+    
+    __slots__ = ('_store', 'key')
+    
+    def __init__(self, store, key):
+        self._store = store
+        self.key = key
+        
+    @property
+    def index(self):
+        return self._store.index_of(self.key)
+        
+    @property
+    def minutes(self):
+        """Durée de travail en minutes, calculée lors de l'écriture de l'entrée"""
+        return self._store.minutes[self.index]
+        
+    def __getitem__(self, field):
+        return self._store.get_field(self.index, field)
+        
+    def __setitem__(self, field, value):
+        self._store.update(self.index, {field: value})
+        
+    def __contains__(self, field):
+        return field in EntryStore.FIELDS
+        
+    def __iter__(self):
+        return iter(EntryStore.FIELDS)
+        
+    def get(self, field, default=None):
+        if field not in EntryStore.FIELDS:
+            return default
+        return self[field]
+        
+    def keys(self):
+        return EntryStore.FIELDS
+        
+    def items(self):
+        return [(field, self[field]) for field in EntryStore.FIELDS]
+        
+    def update(self, fields):
+        self._store.update(self.index, fields)
+        
+    def to_dict(self):
+        return self._store.to_dict(self.index)
+
+
+class EntryStore:
+    """Stockage compact des entrées : une colonne array par champ au lieu d'un dict par entrée
+    
+    Les dates et heures sont conservées en minutes depuis le 01/01/1970 et la catégorie est
+    codée par un petit entier. La première pause occupe les colonnes break_starts/break_ends ;
+    les pauses suivantes, rares, sont rangées dans extra_breaks par clé d'entrée.
+    Les totaux d'heures (global et par catégorie) sont tenus à jour à chaque modification,
+    et chaque modification est consignée dans self.journal en attendant d'être sauvegardée.
+    Les IDs sont permanents et un index chronologique (sorted_starts/sorted_keys) est
+    maintenu par insertion dichotomique.
+    """
+    
+    FIELDS = ('id', 'start_date', 'start_time', 'end_date', 'end_time', 'category', 'has_break',
+              'break_start_hour', 'break_start_min', 'break_end_hour', 'break_end_min', 'breaks')
+    TIME_FIELDS = frozenset(FIELDS) - {'id', 'category'}
+    # Champs de l'ancien format à pause unique, rattachée à la date de début
+    BREAK_FIELDS = frozenset(('has_break', 'break_start_hour', 'break_start_min',
+                              'break_end_hour', 'break_end_min'))
+    
+    def __init__(self, categories=()):
+        self.categories = list(categories)
+        self._category_codes = {name: code for code, name in enumerate(self.categories)}
+        self._next_key = 0
+        self._positions = {}
+        self.keys = array('q')
+        self.ids = array('q')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.break_starts = array('q')
+        self.break_ends = array('q')
+        # Pauses au-delà de la première : clé -> liste de (début, fin)
+        self.extra_breaks = {}
+        # Ancien format, pause cochée mais illisible (champ vide...) : ignorée dans les calculs,
+        # ses champs sont conservés tels quels pour la sauvegarde (clé -> champs de pause)
+        self.raw_breaks = {}
+        self.minutes = array('q')
+        self.category_codes = array('B')
+        # Totaux courants en centièmes d'heure, pour éviter de tout recalculer
+        self.total_centihours = 0
+        self.category_centihours = [0] * len(self.categories)
+        # Totaux par période et par granularité : premier jour -> [nombre d'entrées, centièmes par catégorie]
+        self.rollups = {granularity: {} for granularity in ROLLUP_GRANULARITIES}
+        # Opérations non encore sauvegardées (les positions font référence à l'ordre du stockage)
+        self.journal = []
+        # Index chronologique : débuts triés et clés correspondantes (ordre d'affichage)
+        self.sorted_starts = array('q')
+        self.sorted_keys = array('q')
+        # Prochain ID attribué à une nouvelle entrée
+        self.next_id = 0
+        # Durée brute maximale des entrées présentes : borne la recherche des entrées qui chevauchent une période
+        self.max_span = 0
+        # Entrées illisibles au chargement, conservées telles quelles pour la sauvegarde
+        self.rejected = []
+        
+    @classmethod
+    def from_dicts(cls, entries, categories=()):
+        """Construit un stockage à partir d'une liste d'entrées au format dict (fichier JSON)
+        
+        Les entrées illisibles ne sont pas affichées mais restent dans store.rejected,
+        réécrites sans modification à chaque sauvegarde.
+        """
+        store = cls(categories)
+        for entry in entries:
+            try:
+                store.append(entry)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.warning("Entrée illisible conservée sans être affichée %s: %s", entry.get('id'), e)
+                store.keep_rejected(entry)
+        # Les entrées chargées sont déjà sauvegardées
+        store.journal.clear()
+        return store
+        
+    def keep_rejected(self, entry):
+        """Conserve une entrée illisible ; son ID reste réservé"""
+        self.rejected.append(entry)
+        try:
+            self.next_id = max(self.next_id, int(entry.get('id')) + 1)
+        except (TypeError, ValueError):
+            pass
+            
+    def __len__(self):
+        return len(self.keys)
+        
+    def __bool__(self):
+        return len(self.keys) > 0
+        
+    def __iter__(self):
+        return (EntryView(self, key) for key in self.keys)
+        
+    def __getitem__(self, index):
+        return EntryView(self, self.keys[index])
+        
+    def index_of(self, key):
+        return self._positions[key]
+        
+    def category_code(self, name):
+        """Retourne le code de la catégorie, en l'enregistrant si elle est inconnue"""
+        code = self._category_codes.get(name)
+        if code is None:
+            if len(self.categories) >= 256:
+                raise ValueError("Trop de catégories différentes")
+            code = len(self.categories)
+            self.categories.append(name)
+            self.category_centihours.append(0)
+            self._category_codes[name] = code
+        return code
+        
+    def _account(self, index, sign):
+        """Ajoute (sign=1) ou retire (sign=-1) la durée d'une entrée des totaux courants"""
+        centihours = sign * to_centihours(self.minutes[index])
+        self.total_centihours += centihours
+        code = self.category_codes[index]
+        self.category_centihours[code] += centihours
+        
+        # Totaux par période : l'entrée compte pour le jour de son début
+        day = self.starts[index] // 1440
+        for granularity, periods in self.rollups.items():
+            key = period_start(day, granularity)
+            period = periods.get(key)
+            if period is None:
+                period = periods[key] = [0, [0] * len(self.categories)]
+            by_category = period[1]
+            if code >= len(by_category):
+                by_category.extend([0] * (code + 1 - len(by_category)))
+            by_category[code] += centihours
+            period[0] += sign
+            if not period[0]:
+                del periods[key]
+        
+    @property
+    def total_hours(self):
+        """Total des heures, durées arrondies à 2 décimales comme dans le tableau"""
+        return self.total_centihours / 100
+        
+    def category_hours(self):
+        """Retourne le total des heures par catégorie"""
+        return {cat: centihours / 100 for cat, centihours in zip(self.categories, self.category_centihours)}
+        
+    def rollup(self, granularity):
+        """Retourne les premiers jours des périodes (triés) et leurs heures par catégorie (tableau NumPy)"""
+        periods = self.rollups[granularity]
+        days = sorted(periods)
+        hours = np.zeros((len(days), len(self.categories)))
+        for row, day in enumerate(days):
+            by_category = periods[day][1]
+            hours[row, :len(by_category)] = by_category
+        return days, hours / 100
+        
+    def total_amount(self, rates):
+        """Calcule le total des gains à partir des totaux courants
+        
+        rates est soit un tarif horaire unique, soit un dict {catégorie: tarif}.
+        """
+        if isinstance(rates, dict):
+            return sum(hours * rates.get(cat, 0.0) for cat, hours in self.category_hours().items())
+        return self.total_hours * float(rates)
+        
+    @staticmethod
+    def parse_entry(entry):
+        """Convertit les champs texte d'une entrée en minutes depuis le 01/01/1970
+        
+        Retourne le début, la fin et la liste triée des pauses (début, fin). La liste
+        'breaks' (dates complètes) prime sur les champs de l'ancien format à pause unique.
+        Lève ValueError si une date, une heure ou la liste 'breaks' est illisible ; une pause
+        illisible de l'ancien format est ignorée, comme dans les versions précédentes.
+        """
+        start = to_epoch_minutes(entry['start_date'], entry['start_time'])
+        end = to_epoch_minutes(entry['end_date'], entry['end_time'])
+        breaks = []
+        if 'breaks' in entry:
+            try:
+                breaks = sorted(tuple(to_epoch_minutes(*moment.split(' ')) for moment in pair)
+                                for pair in entry['breaks'])
+            except (ValueError, TypeError, AttributeError) as e:
+                raise ValueError(f"Pauses illisibles: {e}")
+        elif entry.get('has_break', False):
+            try:
+                # Ancien format : la pause est rattachée à la date de début
+                breaks = [(to_epoch_minutes(entry['start_date'],
+                                            f"{entry['break_start_hour']}:{entry['break_start_min']}"),
+                           to_epoch_minutes(entry['start_date'],
+                                            f"{entry['break_end_hour']}:{entry['break_end_min']}"))]
+            except (ValueError, KeyError):
+                breaks = []
+        return start, end, breaks
+        
+    @classmethod
+    def unread_break(cls, entry, breaks):
+        """Champs de pause de l'ancien format à conserver quand la pause cochée n'a pas pu être lue (sinon None)"""
+        if breaks or 'breaks' in entry or not entry.get('has_break', False):
+            return None
+        return {field: entry[field] for field in cls.BREAK_FIELDS if field in entry}
+        
+    def append(self, entry):
+        """Ajoute une entrée au format dict et retourne sa vue"""
+        start, end, breaks = self.parse_entry(entry)
+        return self.append_row(entry.get('id'), start, end, breaks,
+                               entry.get('category') or self.categories[0],
+                               raw_break=self.unread_break(entry, breaks))
+        
+    def append_row(self, entry_id, start, end, breaks, category, raw_break=None):
+        """Ajoute une entrée déjà convertie en minutes (pauses triées) et retourne sa vue
+        
+        raw_break : champs d'une pause illisible de l'ancien format, conservés pour la sauvegarde.
+        """
+        code = self.category_code(category)
+        key = self._next_key
+        self._next_key += 1
+        self._positions[key] = len(self.keys)
+        self.keys.append(key)
+        entry_id = self.next_id if entry_id is None else int(entry_id)
+        self.next_id = max(self.next_id, entry_id + 1)
+        self.ids.append(entry_id)
+        self.starts.append(start)
+        self.ends.append(end)
+        self._set_breaks(key, len(self.keys) - 1, breaks, append=True)
+        if raw_break is not None:
+            self.raw_breaks[key] = raw_break
+        self.minutes.append(compute_duration_minutes(start, end, breaks))
+        self.category_codes.append(code)
+        self._account(len(self.keys) - 1, 1)
+        self._index_insert(key, start)
+        self.max_span = max(self.max_span, end - start)
+        self.journal.append({'op': 'add', 'entry': self.to_dict(len(self.keys) - 1)})
+        return EntryView(self, key)
+        
+    def _set_breaks(self, key, index, breaks, append=False):
+        """Range les pauses triées d'une entrée : la première dans les colonnes, les autres dans extra_breaks"""
+        first = breaks[0] if breaks else (NO_BREAK, NO_BREAK)
+        if append:
+            self.break_starts.append(first[0])
+            self.break_ends.append(first[1])
+        else:
+            self.break_starts[index], self.break_ends[index] = first
+        if len(breaks) > 1:
+            self.extra_breaks[key] = list(breaks[1:])
+        else:
+            self.extra_breaks.pop(key, None)
+            
+    def breaks(self, index):
+        """Retourne la liste triée des pauses (début, fin) d'une entrée"""
+        if self.break_starts[index] == NO_BREAK:
+            return []
+        return [(self.break_starts[index], self.break_ends[index])] + self.extra_breaks.get(self.keys[index], [])
+        
+    def break_table(self):
+        """Retourne toutes les pauses à plat (tableaux NumPy) : position de l'entrée, début, fin"""
+        break_starts = np.frombuffer(self.break_starts, dtype=np.int64)
+        break_ends = np.frombuffer(self.break_ends, dtype=np.int64)
+        owners = np.flatnonzero(break_starts != NO_BREAK)
+        starts = break_starts[owners]
+        ends = break_ends[owners]
+        if self.extra_breaks:
+            extra_owners = [self._positions[key] for key, breaks in self.extra_breaks.items() for _ in breaks]
+            extra = np.array([pair for breaks in self.extra_breaks.values() for pair in breaks], dtype=np.int64)
+            owners = np.concatenate([owners, np.array(extra_owners, dtype=np.int64)])
+            starts = np.concatenate([starts, extra[:, 0]])
+            ends = np.concatenate([ends, extra[:, 1]])
+        return owners, starts, ends
+        
+    def extend_rows(self, starts, ends, break_starts, break_ends, codes, extra_breaks=None):
+        """Ajoute en une fois des entrées déjà converties (tableaux NumPy, codes de catégorie)
+        
+        Les colonnes de pause portent la première pause de chaque entrée (NO_BREAK : pas de
+        pause) ; extra_breaks donne les pauses suivantes, triées : {rang de l'entrée: [(début, fin), ...]}.
+        Les IDs sont attribués à la suite, les totaux et l'index chronologique sont mis à
+        jour en une seule passe. Les ajouts ne sont pas consignés dans le journal :
+        l'appelant doit réécrire l'instantané (voir WorkHoursEngine.import_csv).
+        Retourne le nombre d'entrées ajoutées.
+        """
+        count = len(starts)
+        if not count:
+            return 0
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        break_starts = np.asarray(break_starts, dtype=np.int64)
+        break_ends = np.asarray(break_ends, dtype=np.int64)
+        codes = np.asarray(codes, dtype=np.uint8)
+        with_break = np.flatnonzero(break_starts != NO_BREAK)
+        owners = with_break
+        all_break_starts = break_starts[with_break]
+        all_break_ends = break_ends[with_break]
+        if extra_breaks:
+            extra_owners = np.array([row for row, pairs in extra_breaks.items() for _ in pairs], dtype=np.int64)
+            extra = np.array([pair for pairs in extra_breaks.values() for pair in pairs], dtype=np.int64)
+            owners = np.concatenate([owners, extra_owners])
+            all_break_starts = np.concatenate([all_break_starts, extra[:, 0]])
+            all_break_ends = np.concatenate([all_break_ends, extra[:, 1]])
+        minutes = duration_minutes(starts, ends, owners, all_break_starts, all_break_ends)
+        
+        first = len(self.keys)
+        keys = np.arange(self._next_key, self._next_key + count, dtype=np.int64)
+        self._next_key += count
+        self._positions.update(zip(keys.tolist(), range(first, first + count)))
+        self.keys.frombytes(keys.tobytes())
+        for row, pairs in (extra_breaks or {}).items():
+            self.extra_breaks[int(keys[row])] = [(int(start), int(end)) for start, end in pairs]
+        self.ids.frombytes(np.arange(self.next_id, self.next_id + count, dtype=np.int64).tobytes())
+        self.next_id += count
+        self.starts.frombytes(starts.tobytes())
+        self.ends.frombytes(ends.tobytes())
+        self.break_starts.frombytes(break_starts.tobytes())
+        self.break_ends.frombytes(break_ends.tobytes())
+        self.minutes.frombytes(minutes.astype(np.int64).tobytes())
+        self.category_codes.frombytes(codes.tobytes())
+        self.max_span = max(self.max_span, int((ends - starts).max()))
+        
+        # Totaux : mêmes arrondis que to_centihours, cumulés par catégorie puis par période
+        centihours = np.round(minutes * 100 / 60).astype(np.int64)
+        self.total_centihours += int(centihours.sum())
+        by_category = np.bincount(codes, weights=centihours, minlength=len(self.categories))
+        for code, value in enumerate(by_category.astype(np.int64).tolist()):
+            self.category_centihours[code] += value
+        days = starts // 1440
+        for granularity, periods in self.rollups.items():
+            period_keys, inverse, counts = np.unique(period_starts(days, granularity),
+                                                     return_inverse=True, return_counts=True)
+            sums = np.zeros((len(period_keys), len(self.categories)), dtype=np.int64)
+            np.add.at(sums, (inverse.ravel(), codes), centihours)
+            for key, added, row in zip(period_keys.tolist(), counts.tolist(), sums.tolist()):
+                period = periods.get(key)
+                if period is None:
+                    period = periods[key] = [0, [0] * len(self.categories)]
+                period[0] += added
+                period_hours = period[1]
+                if len(period_hours) < len(row):
+                    period_hours.extend([0] * (len(row) - len(period_hours)))
+                for code, value in enumerate(row):
+                    period_hours[code] += value
+        
+        # Index chronologique reconstruit une seule fois (tri stable : mêmes égalités que bisect_right)
+        all_starts = np.concatenate([np.frombuffer(self.sorted_starts, dtype=np.int64), starts])
+        all_keys = np.concatenate([np.frombuffer(self.sorted_keys, dtype=np.int64), keys])
+        order = np.argsort(all_starts, kind='stable')
+        self.sorted_starts = array('q', all_starts[order].tobytes())
+        self.sorted_keys = array('q', all_keys[order].tobytes())
+        return count
+        
+    def _index_insert(self, key, start):
+        """Insère une entrée dans l'index chronologique en O(log n) comparaisons"""
+        i = bisect_right(self.sorted_starts, start)
+        self.sorted_starts.insert(i, start)
+        self.sorted_keys.insert(i, key)
+        
+    def _index_remove(self, key, start):
+        """Retire une entrée de l'index chronologique"""
+        lo = bisect_left(self.sorted_starts, start)
+        hi = bisect_right(self.sorted_starts, start, lo)
+        i = self.sorted_keys.index(key, lo, hi)
+        del self.sorted_starts[i]
+        del self.sorted_keys[i]
+        
+    def ensure_unique_ids(self):
+        """Attribue un nouvel ID aux entrées dont l'ID est déjà utilisé (fichiers anciens ou modifiés)
+        
+        Les changements sont consignés dans le journal ; retourne le nombre d'entrées renumérotées.
+        """
+        seen = set()
+        renumbered = 0
+        for i, entry_id in enumerate(self.ids):
+            if entry_id in seen:
+                entry_id = self.next_id
+                self.update(i, {'id': entry_id})
+                renumbered += 1
+            seen.add(entry_id)
+        return renumbered
+        
+    def update(self, index, fields):
+        """Met à jour les champs d'une entrée et recalcule sa durée si nécessaire"""
+        self._account(index, -1)
+        try:
+            self._update_fields(index, fields)
+        finally:
+            self._account(index, 1)
+            
+    def _update_fields(self, index, fields):
+        if 'id' in fields:
+            self.ids[index] = int(fields['id'])
+            self.next_id = max(self.next_id, self.ids[index] + 1)
+        if 'category' in fields:
+            self.category_codes[index] = self.category_code(fields['category'])
+        if self.TIME_FIELDS.intersection(fields):
+            entry = self.to_dict(index)
+            entry.update(fields)
+            if self.BREAK_FIELDS.intersection(fields) and 'breaks' not in fields:
+                # Pause unique saisie dans l'ancien format : elle remplace la liste
+                entry.pop('breaks', None)
+            start, end, breaks = self.parse_entry(entry)
+            if 'breaks' not in fields and not self.BREAK_FIELDS.intersection(fields):
+                # Pauses inchangées : elles suivent la date de début
+                shift = (start // 1440 - self.starts[index] // 1440) * 1440
+                breaks = [(break_start + shift, break_end + shift) for break_start, break_end in self.breaks(index)]
+            else:
+                # Nouvelles pauses : une pause illisible saisie dans l'ancien format reste conservée
+                raw_break = self.unread_break(entry, breaks)
+                if raw_break is None:
+                    self.raw_breaks.pop(self.keys[index], None)
+                else:
+                    self.raw_breaks[self.keys[index]] = raw_break
+            if start != self.starts[index]:
+                self._index_remove(self.keys[index], self.starts[index])
+                self._index_insert(self.keys[index], start)
+            shortened = self.ends[index] - self.starts[index] == self.max_span > end - start
+            self.starts[index] = start
+            self.ends[index] = end
+            if shortened:
+                # L'entrée la plus longue raccourcit : la borne est recalculée
+                self._refresh_max_span()
+            else:
+                self.max_span = max(self.max_span, end - start)
+            self._set_breaks(self.keys[index], index, breaks)
+            self.minutes[index] = compute_duration_minutes(start, end, breaks)
+        # Les IDs sont permanents : un changement d'ID est consigné comme les autres champs
+        if 'id' in fields or 'category' in fields or self.TIME_FIELDS.intersection(fields):
+            self.journal.append({'op': 'edit', 'index': index, 'entry': self.to_dict(index)})
+            
+    def __contains__(self, key):
+        return key in self._positions
+        
+    def remove_ids(self, ids):
+        """Supprime les entrées dont l'ID figure dans ids"""
+        ids = set(ids)
+        self.remove_keys(key for key, entry_id in zip(self.keys, self.ids) if entry_id in ids)
+        
+    def remove_keys(self, keys):
+        """Supprime les entrées dont la clé figure dans keys"""
+        keys = set(keys)
+        kept = []
+        removed = []
+        longest = False
+        for i, key in enumerate(self.keys):
+            if key in keys:
+                longest = longest or self.ends[i] - self.starts[i] == self.max_span
+                self._account(i, -1)
+                self.extra_breaks.pop(key, None)
+                self.raw_breaks.pop(key, None)
+                removed.append(i)
+            else:
+                kept.append(i)
+        if not removed:
+            return
+        self.journal.append({'op': 'delete', 'indexes': removed})
+        
+        # Index chronologique : retrait ciblé, ou reconstruction pour une suppression massive
+        if len(removed) < 64:
+            for i in removed:
+                self._index_remove(self.keys[i], self.starts[i])
+        else:
+            kept_index = [i for i, key in enumerate(self.sorted_keys) if key not in keys]
+            self.sorted_starts = array('q', (self.sorted_starts[i] for i in kept_index))
+            self.sorted_keys = array('q', (self.sorted_keys[i] for i in kept_index))
+        for name in ('keys', 'ids', 'starts', 'ends', 'break_starts', 'break_ends',
+                     'minutes', 'category_codes'):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[i] for i in kept]))
+        self._positions = {key: i for i, key in enumerate(self.keys)}
+        if longest:
+            self._refresh_max_span()
+        
+    def _refresh_max_span(self):
+        """Recalcule la durée brute maximale après la suppression ou le raccourcissement de la plus longue entrée
+        
+        Sans ce recalcul, une seule entrée très longue, même supprimée, élargirait toutes les recherches.
+        """
+        if not self.keys:
+            self.max_span = 0
+            return
+        spans = np.frombuffer(self.ends, dtype=np.int64) - np.frombuffer(self.starts, dtype=np.int64)
+        self.max_span = int(spans.max())
+        
+    def clear(self):
+        """Supprime toutes les entrées"""
+        if not self.keys:
+            return
+        self.remove_keys(self.keys)
+        # Une seule opération plutôt que la liste de toutes les positions
+        self.journal[-1] = {'op': 'clear'}
+        
+    def copy(self):
+        """Retourne une copie indépendante du stockage (copie des colonnes, sans journal)"""
+        store = EntryStore(self.categories)
+        for name in ('keys', 'ids', 'starts', 'ends', 'break_starts', 'break_ends',
+                     'minutes', 'category_codes'):
+            column = getattr(self, name)
+            setattr(store, name, array(column.typecode, column))
+        store.sorted_starts = array('q', self.sorted_starts)
+        store.sorted_keys = array('q', self.sorted_keys)
+        store._positions = dict(self._positions)
+        store.extra_breaks = dict(self.extra_breaks)
+        store.raw_breaks = dict(self.raw_breaks)
+        store.rejected = list(self.rejected)
+        store._next_key = self._next_key
+        store.next_id = self.next_id
+        store.max_span = self.max_span
+        store.total_centihours = self.total_centihours
+        store.category_centihours = list(self.category_centihours)
+        store.rollups = {granularity: {key: [count, list(by_category)]
+                                       for key, (count, by_category) in periods.items()}
+                         for granularity, periods in self.rollups.items()}
+        return store
+        
+    def pop_journal(self):
+        """Retourne les opérations en attente de sauvegarde et vide le journal"""
+        journal, self.journal = self.journal, []
+        return journal
+        
+    def replay(self, op):
+        """Rejoue une opération du journal (fichier .journal) sur le stockage"""
+        if op['op'] == 'add':
+            self.append(op['entry'])
+        elif op['op'] == 'edit':
+            self.update(op['index'], op['entry'])
+        elif op['op'] == 'delete':
+            self.remove_keys([self.keys[i] for i in op['indexes']])
+        elif op['op'] == 'clear':
+            self.clear()
+        
+    def overlapping(self, start, end):
+        """Retourne les clés (ordre chronologique) des entrées qui chevauchent [start, end[
+        
+        Seuls les débuts compris entre start - max_span et end sont examinés :
+        recherche dichotomique puis parcours des k candidats, soit O(log n + k).
+        """
+        lo = bisect_left(self.sorted_starts, start - self.max_span)
+        hi = bisect_left(self.sorted_starts, end, lo)
+        positions = self._positions
+        ends = self.ends
+        return [key for key in self.sorted_keys[lo:hi] if ends[positions[key]] > start]
+        
+    def latest(self, count):
+        """Retourne les positions des count entrées les plus récentes, de la plus récente à la plus ancienne"""
+        return [self._positions[key] for key in reversed(self.sorted_keys[-count:])] if count else []
+        
+    def get_field(self, index, field):
+        """Retourne la valeur texte d'un champ, comme dans le format dict d'origine"""
+        if field == 'id':
+            return self.ids[index]
+        if field == 'start_date':
+            return format_date(self.starts[index])
+        if field == 'start_time':
+            return format_time(self.starts[index])
+        if field == 'end_date':
+            return format_date(self.ends[index])
+        if field == 'end_time':
+            return format_time(self.ends[index])
+        if field == 'category':
+            return self.categories[self.category_codes[index]]
+        if field == 'has_break':
+            return self.break_starts[index] != NO_BREAK
+        if field == 'breaks':
+            return [[f"{format_date(moment)} {format_time(moment)}" for moment in pair]
+                    for pair in self.breaks(index)]
+        if field in ('break_start_hour', 'break_start_min', 'break_end_hour', 'break_end_min'):
+            value = self.break_starts[index] if field.startswith('break_start') else self.break_ends[index]
+            if value == NO_BREAK:
+                return ''
+            hour, minute = format_time(value).split(':')
+            return hour if field.endswith('hour') else minute
+        raise KeyError(field)
+        
+    def to_dict(self, index):
+        """Retourne l'entrée au format dict d'origine
+        
+        La liste 'breaks' n'est ajoutée que si les champs à pause unique ne suffisent pas
+        (plusieurs pauses, ou pause qui ne tombe pas le jour du début) : les anciennes
+        entrées sont enregistrées à l'identique, pause illisible comprise.
+        """
+        entry = {field: self.get_field(index, field) for field in self.FIELDS if field != 'breaks'}
+        raw_break = self.raw_breaks.get(self.keys[index])
+        if raw_break is not None:
+            entry.update(raw_break)
+            return entry
+        day = self.starts[index] // 1440
+        break_start = self.break_starts[index]
+        if self.keys[index] in self.extra_breaks or (
+                break_start != NO_BREAK and (break_start // 1440 != day or self.break_ends[index] // 1440 != day)):
+            entry['breaks'] = self.get_field(index, 'breaks')
+        return entry
+        
+    def to_list(self):
+        """Retourne toutes les entrées au format dict (pour la sauvegarde JSON), entrées illisibles comprises"""
+        return [self.to_dict(i) for i in range(len(self.keys))] + self.rejected
+
+class JournalStorage:
+    """Persistance par instantané JSON complet + journal des opérations en ajout seul
+    
+    Chaque sauvegarde n'ajoute que les opérations récentes au fichier .journal ;
+    l'instantané est réécrit (compaction) quand le journal devient trop long.
+    """
+    
+    def __init__(self, path='work_hours_data.json', compact_threshold=500):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + '.journal'
+        self.compact_threshold = compact_threshold
+        # Numéro de la dernière opération écrite et nombre d'opérations dans le journal
+        self.seq = 0
+        self.journal_length = 0
+        
+    def load(self):
+        """Retourne les données de l'instantané et les opérations du journal à rejouer"""
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            if not os.path.exists(self.journal_path):
+                raise
+            data = {}
+        self.seq = data.get('journal_seq', 0)
+        
+        # Opérations postérieures à l'instantané (une ligne tronquée par un arrêt brutal est ignorée)
+        ops = []
+        self.journal_length = 0
+        try:
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    self.journal_length += 1
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        logger.warning("Ligne de journal illisible ignorée: %r", line[:80])
+                        continue
+                    if op.get('seq', 0) > self.seq:
+                        ops.append(op)
+                        self.seq = op['seq']
+        except FileNotFoundError:
+            pass
+        return data, ops
+        
+    def append(self, ops):
+        """Ajoute des opérations à la fin du journal"""
+        if not ops:
+            return
+        seq = self.seq
+        lines = []
+        for op in ops:
+            seq += 1
+            lines.append(json.dumps(dict(op, seq=seq)) + '\n')
+        # En cas d'échec, les mêmes numéros seront réutilisés : une ligne écrite deux fois
+        # n'est rejouée qu'une seule fois
+        with open(self.journal_path, 'a') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.seq = seq
+        self.journal_length += len(ops)
+        
+    def write_snapshot(self, data):
+        """Réécrit l'instantané complet (fichier temporaire puis renommage atomique) et vide le journal"""
+        data = dict(data, journal_seq=self.seq)
+        if isinstance(data.get('entries'), EntryStore):
+            data['entries'] = data['entries'].to_list()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        # Les opérations du journal sont incluses dans l'instantané (journal_seq)
+        open(self.journal_path, 'w').close()
+        self.journal_length = 0
+
+
+class SqliteStorage:
+    """Persistance SQLite (mode WAL), même interface que JournalStorage
+    
+    Les opérations sont appliquées directement à la table des entrées, indexée sur le début,
+    la fin et la catégorie. load(start, end) ne lit que les entrées d'une période grâce à ces
+    index (ligne de commande) ; l'interface charge toujours toute la table en mémoire.
+    Une connexion unique est partagée entre le thread Tk et le thread d'écriture, protégée
+    par un verrou.
+    """
+    
+    # Les opérations sont écrites directement en base : pas de compaction nécessaire
+    compact_threshold = float('inf')
+    journal_length = 0
+    
+    def __init__(self, path='work_hours_data.db', read_only=False):
+        """read_only=True : base ouverte en lecture seule (ligne de commande), sans aucune écriture,
+        même pas la création des tables ou le passage en mode WAL ; la base doit exister"""
+        self.path = path
+        self._lock = threading.Lock()
+        # row_id des lignes, dans l'ordre des positions du stockage en mémoire
+        self._row_ids = array('q')
+        # Vrai en lecture seule ou après un chargement partiel (positions incomplètes)
+        self.read_only = self._read_only_file = read_only
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+            self._has_extra_breaks = 'extra_breaks' in columns
+            return
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    entry_id INTEGER NOT NULL,
+                    start_minute INTEGER NOT NULL,
+                    end_minute INTEGER NOT NULL,
+                    break_start INTEGER,
+                    break_end INTEGER,
+                    minutes INTEGER NOT NULL,
+                    category TEXT NOT NULL,
+                    extra_breaks TEXT
+                );
+                CREATE INDEX IF NOT EXISTS entries_start ON entries (start_minute);
+                CREATE INDEX IF NOT EXISTS entries_end ON entries (end_minute);
+                CREATE INDEX IF NOT EXISTS entries_category ON entries (category, start_minute);
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+            """)
+            # Bases créées avant les pauses multiples
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(entries)")]
+            if 'extra_breaks' not in columns:
+                self._conn.execute("ALTER TABLE entries ADD COLUMN extra_breaks TEXT")
+        self._has_extra_breaks = True
+        
+    def close(self):
+        with self._lock:
+            self._conn.close()
+            
+    @staticmethod
+    def _record(entry):
+        """Convertit une entrée au format dict en ligne de la table entries
+        
+        La première pause occupe break_start/break_end, les suivantes extra_breaks (JSON) ;
+        les champs d'une pause illisible de l'ancien format y sont conservés ({"legacy": ...}).
+        """
+        start, end, breaks = EntryStore.parse_entry(entry)
+        minutes = compute_duration_minutes(start, end, breaks)
+        break_start, break_end = breaks[0] if breaks else (None, None)
+        extra_breaks = json.dumps(breaks[1:]) if len(breaks) > 1 else None
+        raw_break = EntryStore.unread_break(entry, breaks)
+        if raw_break is not None:
+            extra_breaks = json.dumps({'legacy': raw_break})
+        return (int(entry.get('id') or 0), start, end, break_start, break_end, minutes,
+                entry.get('category') or '', extra_breaks)
+        
+    def load(self, start=None, end=None):
+        """Retourne les paramètres et un EntryStore déjà construit (aucune opération à rejouer)
+        
+        Avec start et end (minutes), seules les entrées qui chevauchent [start, end[ sont lues,
+        par une requête sur les index ; le stockage passe alors en lecture seule.
+        """
+        # Base ancienne ouverte en lecture seule : pas de colonne extra_breaks
+        query = f"""
+            SELECT row_id, entry_id, start_minute, end_minute, break_start, break_end, category,
+                   {'extra_breaks' if self._has_extra_breaks else 'NULL'}
+            FROM entries
+        """
+        params = ()
+        if start is not None and end is not None:
+            query += " WHERE start_minute < ? AND end_minute > ?"
+            params = (end, start)
+        with self._lock:
+            data = {key: json.loads(value)
+                    for key, value in self._conn.execute("SELECT key, value FROM settings")}
+            store = EntryStore(data.get('categories', ()))
+            row_ids = array('q')
+            rows = self._conn.execute(query + " ORDER BY row_id", params)
+            for row_id, entry_id, start, end, break_start, break_end, category, extra_breaks in rows:
+                breaks = [] if break_start is None else [(break_start, break_end)]
+                raw_break = None
+                if extra_breaks:
+                    extra_breaks = json.loads(extra_breaks)
+                    if isinstance(extra_breaks, dict):
+                        raw_break = extra_breaks['legacy']
+                    else:
+                        breaks.extend(tuple(pair) for pair in extra_breaks)
+                store.append_row(entry_id, start, end, breaks, category, raw_break=raw_break)
+                row_ids.append(row_id)
+            for entry in data.pop('rejected_entries', []):
+                store.keep_rejected(entry)
+            store.journal.clear()
+            self._row_ids = row_ids
+            self.read_only = self._read_only_file or bool(params)
+        data['entries'] = store
+        return data, []
+        
+    def append(self, ops):
+        """Applique des opérations du journal à la base, en une seule transaction"""
+        if not ops:
+            return
+        self._check_writable()
+        with self._lock, self._conn:
+            # Copie : en cas d'échec la transaction est annulée et les positions restent valables
+            row_ids = array('q', self._row_ids)
+            for op in ops:
+                kind = op['op']
+                if kind == 'add':
+                    cursor = self._conn.execute("""
+                        INSERT INTO entries (entry_id, start_minute, end_minute, break_start,
+                                             break_end, minutes, category, extra_breaks)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, self._record(op['entry']))
+                    row_ids.append(cursor.lastrowid)
+                elif kind == 'edit':
+                    self._conn.execute("""
+                        UPDATE entries SET entry_id = ?, start_minute = ?, end_minute = ?,
+                            break_start = ?, break_end = ?, minutes = ?, category = ?, extra_breaks = ?
+                        WHERE row_id = ?
+                    """, self._record(op['entry']) + (row_ids[op['index']],))
+                elif kind == 'delete':
+                    removed = set(op['indexes'])
+                    self._conn.executemany("DELETE FROM entries WHERE row_id = ?",
+                                           [(row_ids[i],) for i in removed])
+                    row_ids = array('q', (row_id for i, row_id in enumerate(row_ids) if i not in removed))
+                elif kind == 'clear':
+                    self._conn.execute("DELETE FROM entries")
+                    row_ids = array('q')
+                elif kind == 'settings':
+                    self._write_settings(op['data'])
+            self._row_ids = row_ids
+            
+    def write_snapshot(self, data):
+        """Remplace tout le contenu de la base par les données fournies
+        
+        Les entrées illisibles sont conservées telles quelles dans le paramètre rejected_entries.
+        """
+        self._check_writable()
+        entries = data.get('entries', [])
+        if isinstance(entries, EntryStore):
+            entries = entries.to_list()
+        records = []
+        rejected = []
+        for entry in entries:
+            try:
+                records.append(self._record(entry))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                rejected.append(entry)
+        settings = {key: value for key, value in data.items() if key not in ('entries', 'journal_seq')}
+        settings['rejected_entries'] = rejected
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.executemany("""
+                INSERT INTO entries (entry_id, start_minute, end_minute, break_start,
+                                     break_end, minutes, category, extra_breaks)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, records)
+            self._write_settings(settings)
+            self._row_ids = array('q', (row_id for (row_id,) in
+                                        self._conn.execute("SELECT row_id FROM entries ORDER BY row_id")))
+            
+    def _write_settings(self, settings):
+        self._conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                               [(key, json.dumps(value)) for key, value in settings.items()])
+        
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("Base ouverte en lecture seule ou chargée partiellement (période) : écriture refusée")
+
+
+def migrate_json_to_sqlite(json_path='work_hours_data.json', db_path='work_hours_data.db'):
+    """Importe en une fois l'instantané JSON et son journal dans une base SQLite"""
+    data, ops = JournalStorage(json_path).load()
+    # Fichiers anciens sans liste de catégories : celles de l'application
+    data.setdefault('categories', list(WorkHoursEngine.DEFAULT_CATEGORIES))
+    store = EntryStore.from_dicts(data.get('entries', []), data['categories'])
+    for op in ops:
+        if op['op'] == 'settings':
+            data.update(op['data'])
+        else:
+            store.replay(op)
+    data['entries'] = store
+    storage = SqliteStorage(db_path)
+    storage.write_snapshot(data)
+    return storage
+
+
+def open_storage(base='work_hours_data'):
+    """Ouvre le stockage des données
+    
+    SQLite est utilisé si la base existe déjà ou si la variable d'environnement
+    WORK_HOURS_STORAGE vaut « sqlite » (l'instantané JSON et/ou son journal existants sont
+    alors migrés). Sinon, l'instantané JSON et son journal sont utilisés.
+    """
+    json_storage = JournalStorage(base + '.json')
+    db_path = base + '.db'
+    if os.path.exists(db_path) or os.environ.get('WORK_HOURS_STORAGE') == 'sqlite':
+        # Après une première session, les entrées peuvent n'être que dans le journal
+        if not os.path.exists(db_path) and (os.path.exists(json_storage.path)
+                                            or os.path.exists(json_storage.journal_path)):
+            return migrate_json_to_sqlite(json_storage.path, db_path)
+        return SqliteStorage(db_path)
+    return json_storage
+
+
+class PersistenceWorker(threading.Thread):
+    """Thread d'écriture des sauvegardes, hors du thread Tk
+    
+    Les demandes rapprochées (pendant delay secondes) sont regroupées en une seule écriture.
+    Les erreurs sont transmises à on_error, appelé depuis ce thread.
+    """
+    
+    def __init__(self, storage, on_error=None, delay=0.5):
+        super().__init__(name="persistence", daemon=True)
+        self.storage = storage
+        self.on_error = on_error
+        self.delay = delay
+        self.queue = queue.Queue()
+        
+    def save(self, ops=(), snapshot=None):
+        """Demande l'ajout d'opérations au journal, ou l'écriture d'un instantané complet"""
+        self.queue.put(('save', list(ops), snapshot))
+        
+    def flush(self, wait=False, timeout=None):
+        """Écrit immédiatement les demandes en attente ; wait=True attend la fin de l'écriture"""
+        done = threading.Event()
+        self.queue.put(('flush', done))
+        if wait:
+            done.wait(timeout)
+            
+    def run(self):
+        ops = []
+        snapshot = None
+        while True:
+            item = self.queue.get()
+            deadline = time.monotonic() + self.delay
+            waiters = []
+            
+            # Regrouper les demandes arrivées pendant le délai
+            while True:
+                if item[0] == 'save':
+                    _, new_ops, new_snapshot = item
+                    if new_snapshot is not None:
+                        # L'instantané inclut toutes les opérations précédentes
+                        ops = []
+                        snapshot = new_snapshot
+                    ops.extend(new_ops)
+                elif item[0] == 'flush':
+                    waiters.append(item[1])
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            
+            # Écrire ; en cas d'échec, les données restent en attente pour la prochaine tentative
+            try:
+                if snapshot is not None:
+                    self.storage.write_snapshot(snapshot)
+                    snapshot = None
+                self.storage.append(ops)
+                ops = []
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+            for done in waiters:
+                done.set()
+
+
+class TariffTable:
+    """Règles de majoration (nuit, week-end, jours fériés, heures supplémentaires) compilées
+    
+    Chaque minute de la semaine reçoit un coefficient : le plus élevé des majorations de
+    nuit et de week-end qui s'y appliquent (1 sinon), et au moins celui des jours fériés
+    pour une minute d'un jour férié. Les sommes cumulées de la table donnent le nombre de
+    minutes pondérées d'un intervalle par deux lectures, sans le découper. Les minutes
+    travaillées au-delà de overtime_hours dans une entrée ajoutent la majoration des heures
+    supplémentaires. Lève ValueError en nommant la règle invalide.
+    """
+    
+    def __init__(self, rules):
+        try:
+            night_start = to_epoch_minutes("1970-01-01", rules['night_start'])
+            night_end = to_epoch_minutes("1970-01-01", rules['night_end'])
+        except (ValueError, KeyError):
+            raise ValueError("Heures de nuit invalides (HH:MM attendu)")
+        multipliers = {}
+        for name in ('night_multiplier', 'weekend_multiplier', 'holiday_multiplier', 'overtime_multiplier'):
+            try:
+                multipliers[name] = float(rules.get(name, 1.0))
+            except (TypeError, ValueError):
+                raise ValueError(f"La majoration {name} n'est pas un nombre valide")
+            if multipliers[name] < 0:
+                raise ValueError(f"La majoration {name} ne peut pas être négative")
+        try:
+            weekend_days = [int(day) for day in rules.get('weekend_days', ())]
+            self.overtime_minutes = round(float(rules.get('overtime_hours', 0)) * 60)
+        except (TypeError, ValueError):
+            raise ValueError("Jours de week-end ou seuil des heures supplémentaires invalides")
+        try:
+            holidays = sorted({to_epoch_minutes(day, "00:00") // 1440 for day in rules.get('holidays', ())})
+        except ValueError:
+            raise ValueError("Jour férié invalide (AAAA-MM-JJ attendu)")
+        self.holidays = np.array(holidays, dtype=np.int64)
+        self.overtime_multiplier = multipliers['overtime_multiplier']
+        
+        # Coefficient de chaque minute de la semaine (minute 0 : lundi 00:00)
+        minutes = np.arange(MINUTES_PER_WEEK)
+        minute_of_day = minutes % 1440
+        if night_start <= night_end:
+            night = (minute_of_day >= night_start) & (minute_of_day < night_end)
+        else:
+            night = (minute_of_day >= night_start) | (minute_of_day < night_end)
+        rates = np.ones(MINUTES_PER_WEEK)
+        rates[night] = np.maximum(rates[night], multipliers['night_multiplier'])
+        weekend = np.isin(minutes // 1440, weekend_days)
+        rates[weekend] = np.maximum(rates[weekend], multipliers['weekend_multiplier'])
+        holiday_rates = np.maximum(rates, multipliers['holiday_multiplier'])
+        
+        # Sommes cumulées : prefix[m] = minutes pondérées du lundi 00:00 à la minute m exclue
+        self.prefix = np.concatenate(([0.0], np.cumsum(rates)))
+        self.holiday_prefix = np.concatenate(([0.0], np.cumsum(holiday_rates)))
+        
+    @staticmethod
+    def _cumulative(prefix, moments):
+        """Minutes pondérées cumulées depuis le lundi 29/12/1969 jusqu'à chaque instant (minutes depuis le 01/01/1970)"""
+        weeks, minute = np.divmod(moments + WEEK_OFFSET, MINUTES_PER_WEEK)
+        return weeks * prefix[-1] + prefix[minute]
+        
+    def weigh(self, starts, ends):
+        """Minutes pondérées des intervalles [starts, ends[ (24h au plus, vides si ends <= starts)"""
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.maximum(np.asarray(ends, dtype=np.int64), starts)
+        weights = self._cumulative(self.prefix, ends) - self._cumulative(self.prefix, starts)
+        if len(self.holidays):
+            # Un intervalle de 24h au plus touche deux jours : corriger la part des jours fériés
+            first_days = starts // 1440
+            last_days = np.maximum(ends - 1, starts) // 1440
+            for day, counted in ((first_days, True), (last_days, last_days != first_days)):
+                holiday = np.isin(day, self.holidays) & counted
+                if not holiday.any():
+                    continue
+                part_start = np.maximum(starts[holiday], day[holiday] * 1440)
+                part_end = np.maximum(np.minimum(ends[holiday], day[holiday] * 1440 + 1440), part_start)
+                weights[holiday] += (self._cumulative(self.holiday_prefix, part_end)
+                                     - self._cumulative(self.holiday_prefix, part_start)
+                                     - self._cumulative(self.prefix, part_end)
+                                     + self._cumulative(self.prefix, part_start))
+        return weights
+        
+    def weighted_minutes(self, starts, ends, minutes, owners, break_starts, break_ends):
+        """Minutes travaillées pondérées de chaque entrée (minutes : durées pauses déduites)
+        
+        Période entière moins l'union de ses pauses, chacune pesée par la table, puis
+        majoration des heures supplémentaires.
+        """
+        valid = minutes > 0
+        weights = np.where(valid, self.weigh(starts, np.where(valid, ends, starts)), 0.0)
+        owners, piece_starts, piece_ends = break_union_pieces(starts, ends, owners, break_starts, break_ends)
+        kept = valid[owners]
+        np.subtract.at(weights, owners[kept], self.weigh(piece_starts[kept], piece_ends[kept]))
+        if self.overtime_minutes > 0:
+            weights += (self.overtime_multiplier - 1) * np.clip(minutes - self.overtime_minutes, 0, None)
+        return weights
+
+
+def compute_durations(entries, rates=0.0, tariff=None):
+    """Calcule en lot les durées (h), montants et anomalies de toutes les entrées d'un EntryStore
+    
+    rates est soit un tarif horaire unique, soit un dict {catégorie: tarif}. Avec tariff
+    (TariffTable), les montants portent sur les heures pondérées par les majorations.
+    Retourne trois tableaux NumPy alignés sur les positions du stockage.
+    """
+    starts = np.frombuffer(entries.starts, dtype=np.int64)
+    ends = np.frombuffer(entries.ends, dtype=np.int64)
+    
+    raw = ends - starts
+    break_table = entries.break_table()
+    minutes = duration_minutes(starts, ends, *break_table)
+    hours = np.round(minutes / 60, 2)
+    paid_hours = hours
+    if tariff is not None:
+        paid_hours = np.round(tariff.weighted_minutes(starts, ends, minutes, *break_table) / 60, 2)
+    
+    # Anomalies reprises des règles de check_all_durations
+    flags = np.zeros(len(raw), dtype=np.uint8)
+    flags[raw <= 0] |= DURATION_INVALID
+    flags[raw > 24 * 60] |= DURATION_TOO_LONG
+    flags[hours <= 0] |= DURATION_EMPTY
+    flags[np.abs(hours - raw / 60) > 2] |= BREAK_TOO_LONG
+    
+    # Montants : tarif unique ou tarif par catégorie
+    if isinstance(rates, dict):
+        codes = np.frombuffer(entries.category_codes, dtype=np.uint8)
+        rate_by_code = np.array([rates.get(cat, 0.0) for cat in entries.categories], dtype=np.float64)
+        amounts = paid_hours * rate_by_code[codes] if len(rate_by_code) else np.zeros_like(hours)
+    else:
+        amounts = paid_hours * float(rates)
+    
+    return hours, amounts, flags
+
+
+def find_overlaps(entries, positions=None):
+    """Repère par balayage les entrées qui chevauchent une entrée antérieure ou qui la dupliquent
+    
+    Les entrées (toutes, ou les positions données) dont la durée brute est valide sont triées
+    par début puis par fin ; une entrée chevauche la précédente qui finit le plus tard si elle
+    commence avant cette fin, et duplique l'entrée précédente si début et fin sont identiques.
+    Tri en O(n log n) puis balayage linéaire : chaque entrée en cause est signalée une fois,
+    avec une seule entrée partenaire.
+    Retourne les positions des entrées en cause, celles des partenaires et un masque des doublons.
+    """
+    starts = np.frombuffer(entries.starts, dtype=np.int64)
+    ends = np.frombuffer(entries.ends, dtype=np.int64)
+    selected = np.arange(len(starts)) if positions is None else np.asarray(positions, dtype=np.int64)
+    raw = ends[selected] - starts[selected]
+    selected = selected[(raw > 0) & (raw <= 24 * 60)]
+    
+    order = np.lexsort((ends[selected], starts[selected]))
+    selected = selected[order]
+    starts = starts[selected]
+    ends = ends[selected]
+    ranks = np.arange(len(selected))
+    
+    # Fin la plus tardive parmi les entrées précédentes, et rang de l'entrée qui l'atteint
+    latest_end = np.maximum.accumulate(ends)
+    holder = np.maximum.accumulate(np.where(ends == latest_end, ranks, 0))
+    previous_end = np.concatenate(([np.iinfo(np.int64).min], latest_end[:-1]))
+    previous_holder = np.concatenate(([0], holder[:-1]))
+    
+    duplicate = np.zeros(len(selected), dtype=bool)
+    duplicate[1:] = (starts[1:] == starts[:-1]) & (ends[1:] == ends[:-1])
+    overlap = duplicate | (starts < previous_end)
+    partners = np.where(duplicate, ranks - 1, previous_holder)
+    return selected[overlap], selected[partners[overlap]], duplicate[overlap]
+
+
+def _break_time(column):
+    """Accesseur d'export d'une colonne de pause (vide sans pause, heures séparées par des virgules si plusieurs)"""
+    side = 0 if column == 'break_starts' else 1
+    def accessor(entries, position, hours, amount):
+        value = getattr(entries, column)[position]
+        if value == NO_BREAK:
+            return ''
+        extra = entries.extra_breaks.get(entries.keys[position])
+        if extra:
+            return ', '.join(format_time(pair[side]) for pair in entries.breaks(position))
+        return format_time(value)
+    return accessor
+
+
+# Accesseurs des colonnes d'export : (entrées, position, durée, montant) -> valeur de la cellule
+EXPORT_ACCESSORS = {
+    'ID': lambda entries, position, hours, amount: str(entries.ids[position]),
+    'Date': lambda entries, position, hours, amount: format_date(entries.starts[position]),
+    'Heure début': lambda entries, position, hours, amount: format_time(entries.starts[position]),
+    'Début pause': _break_time('break_starts'),
+    'Fin pause': _break_time('break_ends'),
+    'Heure fin': lambda entries, position, hours, amount: format_time(entries.ends[position]),
+    'Durée': lambda entries, position, hours, amount: f"{hours:.2f}",
+    'Catégorie': lambda entries, position, hours, amount: entries.categories[entries.category_codes[position]],
+    'Montant': lambda entries, position, hours, amount: f"{amount:.2f} €",
+}
+
+# Variantes numériques (tableurs) : ID, durée et montant en nombres
+NUMERIC_ACCESSORS = dict(EXPORT_ACCESSORS, **{
+    'ID': lambda entries, position, hours, amount: entries.ids[position],
+    'Durée': lambda entries, position, hours, amount: hours,
+    'Montant': lambda entries, position, hours, amount: amount,
+})
+
+
+class ExportPipeline:
+    """Lignes d'un export, communes à tous les formats (PDF, PNG, CSV, XLSX)
+    
+    Les colonnes choisies sont résolues une seule fois en accesseurs ; rows() produit les
+    lignes à la demande et tient à jour les totaux, lus ensuite par totals_row().
+    Les entrées sont une copie : rows() peut être consommé par un autre thread.
+    """
+    
+    def __init__(self, entries, positions, hours, amounts, columns, numeric=False):
+        accessors = NUMERIC_ACCESSORS if numeric else EXPORT_ACCESSORS
+        self.headers = [col for col in columns if col in accessors]
+        self._accessors = tuple(accessors[col] for col in self.headers)
+        self.numeric = numeric
+        self.entries = entries
+        self.positions = positions
+        self._hours = hours
+        self._amounts = amounts
+        self.count = len(positions)
+        self.written = 0
+        self.total_hours = 0.0
+        self.total_amount = 0.0
+        
+    def rows(self, group_by=None):
+        """Génère les lignes (listes de cellules) dans l'ordre des positions
+        
+        Avec group_by ('mois' ou 'catégorie'), génère des couples (groupe, ligne),
+        le groupe étant le mois AAAA-MM du début ou le nom de la catégorie.
+        """
+        entries = self.entries
+        accessors = self._accessors
+        if group_by == 'mois':
+            group_of = lambda position: format_date(entries.starts[position])[:7]
+        elif group_by == 'catégorie':
+            group_of = lambda position: entries.categories[entries.category_codes[position]]
+        elif group_by is not None:
+            raise ValueError(f"Regroupement inconnu : {group_by}")
+        for position, hours, amount in zip(self.positions, self._hours, self._amounts):
+            self.total_hours += hours
+            self.total_amount += amount
+            self.written += 1
+            row = [accessor(entries, position, hours, amount) for accessor in accessors]
+            yield row if group_by is None else (group_of(position), row)
+            
+    def totals_row(self):
+        """Retourne la ligne des totaux des lignes déjà produites"""
+        totals = [''] * len(self.headers)
+        total_hours = round(self.total_hours, 2)
+        total_amount = round(self.total_amount, 2)
+        if 'Durée' in self.headers:
+            totals[self.headers.index('Durée')] = total_hours if self.numeric else f"{total_hours:.2f}"
+        if 'Montant' in self.headers:
+            totals[self.headers.index('Montant')] = total_amount if self.numeric else f"{total_amount:.2f} €"
+        return totals
+
+
+# Import CSV : colonnes reconnues (noms de champs ou en-têtes de l'export) et taille des lots lus
+IMPORT_COLUMNS = {
+    'start_date': ('start_date', 'Date', 'Date début'),
+    'start_time': ('start_time', 'Heure début'),
+    'end_date': ('end_date', 'Date fin'),
+    'end_time': ('end_time', 'Heure fin'),
+    'break_start': ('break_start', 'Début pause'),
+    'break_end': ('break_end', 'Fin pause'),
+    'category': ('category', 'Catégorie'),
+}
+IMPORT_CHUNK_ROWS = 10000
+
+def _parse_dates(values):
+    """Convertit des dates AAAA-MM-JJ en jours depuis le 01/01/1970 ; retourne (jours, valides)
+    
+    Les dates complètes (10 caractères) sont converties en lot par NumPy ; les autres
+    (2024-1-5...) et celles que NumPy refuse passent par strptime, comme dans verify_duration.
+    """
+    values = np.array(values, dtype=str)
+    valid = np.char.str_len(values) == 10
+    try:
+        days = np.where(valid, values, '1970-01-01').astype('datetime64[D]').astype(np.int64)
+    except ValueError:
+        # Au moins une date impossible dans le lot : conversion une par une
+        days = np.zeros(len(values), dtype=np.int64)
+        for i in np.flatnonzero(valid):
+            try:
+                days[i] = np.datetime64(values[i], 'D').astype(np.int64)
+            except ValueError:
+                valid[i] = False
+    for i in np.flatnonzero(~valid):
+        try:
+            days[i] = datetime.strptime(values[i], "%Y-%m-%d").toordinal() - EPOCH_ORDINAL
+        except ValueError:
+            continue
+        valid[i] = True
+    return days, valid
+
+def _parse_times(values):
+    """Convertit des heures HH:MM en minutes depuis minuit ; retourne (minutes, valides)"""
+    hours, separators, minutes = np.char.partition(np.array(values, dtype=str), ':').T
+    valid = ((separators == ':') & np.char.isdigit(hours) & np.char.isdigit(minutes)
+             & (np.char.str_len(hours) <= 2) & (np.char.str_len(minutes) <= 2))
+    hours = np.where(valid, hours, '0').astype(np.int64)
+    minutes = np.where(valid, minutes, '0').astype(np.int64)
+    valid &= (hours < 24) & (minutes < 60)
+    return hours * 60 + minutes, valid
+
+
+class WorkHoursEngine:
+    """Entrées, taux, calculs et sauvegarde de l'application, sans interface
+    
+    Les méthodes signalent les erreurs par leur valeur de retour (vérifications)
+    ou par des exceptions (chargement, sauvegarde) : c'est à l'appelant de les afficher.
+    """
+    
+    DEFAULT_CATEGORIES = ["Travail normal", "Travail de nuit", "Heures supplémentaires", "Week-end"]
+    # Colonnes disponibles à l'export, dans l'ordre du tableau
+    EXPORT_COLUMNS = ('ID', 'Date', 'Heure début', 'Début pause', 'Fin pause',
+                      'Heure fin', 'Durée', 'Catégorie', 'Montant')
+    # Règles de majoration (voir TariffTable), désactivées par défaut
+    DEFAULT_TARIFF_RULES = {
+        'enabled': False,
+        'night_start': '21:00',
+        'night_end': '06:00',
+        'night_multiplier': 1.25,
+        'weekend_days': [5, 6],
+        'weekend_multiplier': 1.5,
+        'holidays': [],
+        'holiday_multiplier': 2.0,
+        'overtime_hours': 8.0,
+        'overtime_multiplier': 1.25
+    }
+    
+    def __init__(self, base='work_hours_data', storage=None, on_error=None):
+        self.categories = list(self.DEFAULT_CATEGORIES)
+        self.category_rates = {cat: 0.0 for cat in self.categories}
+        self.hourly_rate = 0.0
+        # Préférences de saisie (pause par défaut), conservées avec les paramètres
+        self.preferences = {
+            'has_break': False,
+            'break_start_hour': '',
+            'break_start_min': '',
+            'break_end_hour': '',
+            'break_end_min': ''
+        }
+        self.entries = EntryStore(self.categories)
+        # Règles de majoration et leur table compilée (None si désactivées)
+        self.tariff_rules = dict(self.DEFAULT_TARIFF_RULES)
+        self.tariff = None
+        
+        # Période filtrée (minutes depuis le 01/01/1970, fin exclue) ou None
+        self.date_filter = None
+        # Catégories retenues (ensemble de noms) ou None pour toutes
+        self.category_filter = None
+        
+        # Sauvegarde : instantané + journal des opérations, écrits par un thread dédié
+        self.storage = storage if storage is not None else open_storage(base)
+        self.persistence = PersistenceWorker(self.storage, on_error=on_error)
+        self._saved_settings = None
+        self._journal_ops = 0
+        
+    def verify_duration(self, start_date, start_time, end_date, end_time):
+        """Vérifie et corrige la durée entre deux dates/heures"""
+        logger.debug("Attempting to verify duration with: start_date=%s, start_time=%s, end_date=%s, end_time=%s",
+                     start_date, start_time, end_date, end_time)
+        try:
+            # Convertir en objets datetime
+            start = datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M")
+            end = datetime.strptime(f"{end_date} {end_time}", "%Y-%m-%d %H:%M")
+            
+            # Vérifier si la date de fin est avant la date de début
+            if end < start:
+                return False, "La date/heure de fin est antérieure à la date/heure de début"
+            
+            # Calculer la durée brute
+            duration = (end - start).total_seconds() / 3600
+            
+            # Vérifier si la durée est raisonnable (moins de 24h)
+            if duration > 24:
+                return False, "La durée ne peut pas dépasser 24 heures"
+            
+            # Vérifier si la durée est positive
+            if duration <= 0:
+                return False, "La durée doit être supérieure à 0"
+            
+            return True, duration
+            
+        except ValueError as e:
+            logger.debug("verify_duration ValueError: %s", e)
+            return False, f"Format de date/heure invalide: {str(e)}"
+        except Exception as e:
+            logger.warning("verify_duration Exception: %s", e)
+            return False, f"Erreur lors de la vérification: {str(e)}"
+
+    def calculate_duration(self, entry):
+        """Calcule la durée de travail en tenant compte des pauses"""
+        try:
+            # Les entrées du stockage ont leur durée calculée lors de l'écriture
+            if isinstance(entry, EntryView):
+                minutes = entry.minutes
+            else:
+                minutes = compute_duration_minutes(*self.entries.parse_entry(entry))
+            # Arrondir à 2 décimales
+            return round(minutes / 60, 2)
+            
+        except Exception as e:
+            logger.warning("Erreur lors du calcul de la durée: %s", e)
+            return 0.0
+
+    def add_entry(self, entry):
+        """Vérifie puis ajoute une entrée ; retourne (True, durée brute) ou (False, message)"""
+        is_valid, result = self.verify_duration(entry['start_date'], entry['start_time'],
+                                                entry['end_date'], entry['end_time'])
+        if is_valid:
+            # L'ID permanent est attribué par le stockage
+            self.entries.append(entry)
+        return is_valid, result
+
+    def edit_entry(self, key, fields):
+        """Vérifie puis modifie une entrée ; retourne (True, durée brute) ou (False, message)"""
+        entry = EntryView(self.entries, key)
+        values = {field: fields.get(field, entry[field])
+                  for field in ('start_date', 'start_time', 'end_date', 'end_time')}
+        is_valid, result = self.verify_duration(values['start_date'], values['start_time'],
+                                                values['end_date'], values['end_time'])
+        if is_valid:
+            # La durée est recalculée par le stockage
+            entry.update(fields)
+        return is_valid, result
+
+    def import_csv(self, filename):
+        """Importe en lot les entrées d'un fichier CSV (séparateur ; ou ,)
+        
+        Colonnes reconnues : voir IMPORT_COLUMNS (l'ID éventuel est ignoré, les IDs sont
+        attribués par le stockage). Sans colonne de date de fin, une heure de fin antérieure
+        au début correspond au lendemain. Plusieurs pauses s'écrivent comme dans l'export, heures
+        séparées par des virgules. Les lignes sont lues par lots et vérifiées avec les
+        règles de verify_duration ; les lignes valides sont ajoutées en une seule fois puis
+        l'instantané est réécrit une seule fois.
+        Retourne le nombre d'entrées importées et la liste des lignes rejetées (numéro, motif).
+        """
+        import csv
+        known = {name.casefold(): name for name in self.categories}
+        columns = {'starts': [], 'ends': [], 'break_starts': [], 'break_ends': [], 'codes': []}
+        # Pauses au-delà de la première : rang de l'entrée importée -> [(début, fin), ...]
+        extra_breaks = {}
+        rejected = []
+        
+        with open(filename, 'r', newline='', encoding='utf-8-sig') as f:
+            delimiter = ';' if ';' in f.readline() else ','
+            f.seek(0)
+            reader = csv.reader(f, delimiter=delimiter)
+            headers = [header.strip() for header in next(reader, [])]
+            positions = {}
+            for field, names in IMPORT_COLUMNS.items():
+                for name in names:
+                    if name in headers:
+                        positions[field] = headers.index(name)
+                        break
+            missing = {'start_date', 'start_time', 'end_time'} - set(positions)
+            if missing:
+                raise ValueError("Colonnes manquantes : " + ", ".join(IMPORT_COLUMNS[field][-1] for field in sorted(missing)))
+            
+            # Numéro de ligne dans le fichier (l'en-tête est la ligne 1)
+            line = 2
+            while True:
+                rows = list(islice(reader, IMPORT_CHUNK_ROWS))
+                if not rows:
+                    break
+                reasons = self._import_chunk(rows, positions, known, columns, extra_breaks)
+                rejected.extend((line + i, reason) for i, reason in reasons)
+                line += len(rows)
+        
+        count = self.entries.extend_rows(*(np.concatenate(values) if values else np.zeros(0, dtype=np.int64)
+                                           for values in columns.values()), extra_breaks=extra_breaks)
+        if count:
+            self.compact()
+        return count, rejected
+
+    def _import_chunk(self, rows, positions, known, columns, extra_breaks):
+        """Vérifie un lot de lignes CSV et ajoute les lignes valides à columns ; retourne les rejets"""
+        def column(field):
+            index = positions.get(field)
+            if index is None:
+                return [''] * len(rows)
+            return [row[index].strip() if index < len(row) else '' for row in rows]
+        
+        start_date_text = column('start_date')
+        start_time_text = column('start_time')
+        end_time_text = column('end_time')
+        # Lignes sans date ni heures (lignes vides, ligne des totaux d'un export) : ignorées
+        blank = np.array([not (a or b or c) for a, b, c in zip(start_date_text, start_time_text, end_time_text)],
+                         dtype=bool)
+        start_days, valid_start_date = _parse_dates(start_date_text)
+        start_times, valid_start_time = _parse_times(start_time_text)
+        end_times, valid_end_time = _parse_times(end_time_text)
+        starts = start_days * 1440 + start_times
+        if 'end_date' in positions:
+            end_days, valid_end_date = _parse_dates(column('end_date'))
+        else:
+            # Export de l'application : pas de date de fin, les nuits se terminent le lendemain
+            end_days = start_days + (end_times < start_times)
+            valid_end_date = np.ones(len(rows), dtype=bool)
+        ends = end_days * 1440 + end_times
+        
+        # Pause facultative (les deux heures vides : pas de pause), datée comme dans anchor_breaks
+        break_start_text = column('break_start')
+        break_end_text = column('break_end')
+        no_break = np.array([not (a or b) for a, b in zip(break_start_text, break_end_text)], dtype=bool)
+        break_start_times, valid_break_start = _parse_times(break_start_text)
+        break_end_times, valid_break_end = _parse_times(break_end_text)
+        valid_break = no_break | (valid_break_start & valid_break_end)
+        break_starts = start_days * 1440 + break_start_times
+        break_ends = start_days * 1440 + break_end_times
+        break_ends += np.where(break_ends < break_starts, 1440, 0)
+        next_day = np.where(break_ends <= starts, 1440, 0)
+        break_starts += next_day
+        break_ends += next_day
+        break_starts = np.where(no_break, NO_BREAK, break_starts)
+        break_ends = np.where(no_break, NO_BREAK, break_ends)
+        
+        # Plusieurs pauses (export de l'application : « 12:00, 16:00 » / « 12:30, 16:15 ») :
+        # lignes rares, datées une à une par anchor_breaks ; la première pause occupe les colonnes
+        several = {}
+        for i, (break_start, break_end) in enumerate(zip(break_start_text, break_end_text)):
+            if ',' not in break_start and ',' not in break_end:
+                continue
+            ranges = list(zip(break_start.split(','), break_end.split(',')))
+            try:
+                if break_start.count(',') != break_end.count(','):
+                    raise ValueError("Nombre de débuts et de fins de pause différent")
+                anchored = anchor_breaks(start_date_text[i], start_time_text[i],
+                                         [(a.strip(), b.strip()) for a, b in ranges])
+                several[i] = sorted(tuple(to_epoch_minutes(*moment.split(' ')) for moment in pair)
+                                    for pair in anchored)
+            except ValueError:
+                several[i] = None
+            valid_break[i] = several[i] is not None
+            if several[i]:
+                break_starts[i], break_ends[i] = several[i][0]
+        
+        # Catégories rapprochées de self.categories (casse ignorée, vide : première catégorie)
+        names = column('category')
+        codes = np.zeros(len(rows), dtype=np.uint8)
+        valid_category = np.ones(len(rows), dtype=bool)
+        for i, name in enumerate(names):
+            category = known.get(name.casefold()) if name else self.categories[0]
+            if category is None:
+                valid_category[i] = False
+            else:
+                codes[i] = self.entries.category_code(category)
+        
+        # Mêmes règles et même ordre que verify_duration
+        valid_format = valid_start_date & valid_start_time & valid_end_date & valid_end_time
+        raw = ends - starts
+        reasons = np.select(
+            [blank, ~valid_format, raw < 0, raw > 24 * 60, raw <= 0, ~valid_break, ~valid_category],
+            ["-",
+             "Format de date/heure invalide",
+             "La date/heure de fin est antérieure à la date/heure de début",
+             "La durée ne peut pas dépasser 24 heures",
+             "La durée doit être supérieure à 0",
+             "Heures de pause invalides",
+             "Catégorie inconnue"],
+            default='')
+        accepted = reasons == ''
+        
+        # Rang des entrées acceptées parmi toutes les entrées importées
+        offset = sum(len(values) for values in columns['starts'])
+        ranks = offset + np.cumsum(accepted) - 1
+        for i, breaks in several.items():
+            if accepted[i] and len(breaks) > 1:
+                extra_breaks[int(ranks[i])] = breaks[1:]
+        
+        columns['starts'].append(starts[accepted])
+        columns['ends'].append(ends[accepted])
+        columns['break_starts'].append(break_starts[accepted])
+        columns['break_ends'].append(break_ends[accepted])
+        columns['codes'].append(codes[accepted])
+        
+        rejected = np.flatnonzero(~accepted & ~blank).tolist()
+        return [(i, reasons[i] + (f" ({names[i]})" if reasons[i] == "Catégorie inconnue" else ""))
+                for i in rejected]
+
+    def set_hourly_rate(self, rate):
+        """Fixe le tarif horaire (un tarif invalide ou négatif vaut 0) et le retourne"""
+        try:
+            rate = float(rate)
+        except (TypeError, ValueError):
+            rate = 0.0
+        self.hourly_rate = max(rate, 0.0)
+        return self.hourly_rate
+
+    def set_category_rates(self, rates):
+        """Remplace les taux par catégorie ; lève ValueError en nommant la catégorie fautive"""
+        new_rates = {}
+        for category, rate in rates.items():
+            try:
+                new_rates[category] = float(rate)
+            except ValueError:
+                raise ValueError(f"Le taux pour {category} n'est pas un nombre valide")
+        self.category_rates = new_rates
+
+    def set_tariff_rules(self, rules):
+        """Remplace les règles de majoration et les compile ; lève ValueError en nommant la règle fautive"""
+        rules = dict(self.DEFAULT_TARIFF_RULES, **rules)
+        table = TariffTable(rules)
+        self.tariff_rules = rules
+        self.tariff = table if rules['enabled'] else None
+
+    def set_date_filter(self, start_text, end_text):
+        """Limite les calculs à la période donnée (AAAA-MM-JJ, fin incluse, bornes vides : ouvertes)"""
+        start_text = start_text.strip()
+        end_text = end_text.strip()
+        try:
+            start = to_epoch_minutes(start_text, "00:00") if start_text else -(2 ** 62)
+            end = to_epoch_minutes(end_text, "00:00") + 1440 if end_text else 2 ** 62
+        except ValueError:
+            raise ValueError("Format de date invalide (AAAA-MM-JJ attendu)")
+        if end <= start:
+            raise ValueError("La date de fin est antérieure à la date de début")
+        self.date_filter = (start, end) if start_text or end_text else None
+
+    def set_category_filter(self, categories):
+        """Limite les calculs aux catégories données (None ou vide : toutes)"""
+        self.category_filter = set(categories) if categories else None
+
+    def active_positions(self):
+        """Retourne les positions des entrées filtrées (toutes sans filtre), par ordre chronologique"""
+        if self.date_filter is None:
+            keys = self.entries.sorted_keys
+        else:
+            keys = self.entries.overlapping(*self.date_filter)
+        positions = [self.entries.index_of(key) for key in keys]
+        if self.category_filter is not None:
+            codes = self.entries.category_codes
+            wanted = {code for code, name in enumerate(self.entries.categories) if name in self.category_filter}
+            positions = [position for position in positions if codes[position] in wanted]
+        return positions
+
+    def total_hours(self):
+        """Total des heures des entrées filtrées (de toutes les entrées sans filtre)"""
+        if self.date_filter is None and self.category_filter is None:
+            # Lecture des totaux courants du stockage : coût constant quelle que soit la taille
+            return self.entries.total_hours
+        minutes = self.entries.minutes
+        return sum(to_centihours(minutes[position]) for position in self.active_positions()) / 100
+
+    def total_amount(self):
+        """Total des gains des entrées filtrées au tarif horaire, majorations comprises"""
+        if self.tariff is None:
+            return self.total_hours() * self.hourly_rate
+        _, amounts, _ = compute_durations(self.entries, self.hourly_rate, self.tariff)
+        return float(amounts[self.active_positions()].sum())
+
+    def summary(self):
+        """Retourne le nombre d'entrées, les heures, le montant et les heures par catégorie des entrées filtrées"""
+        positions = self.active_positions()
+        hours, amounts, _ = compute_durations(self.entries, self.hourly_rate, self.tariff)
+        hours = hours[positions]
+        codes = np.frombuffer(self.entries.category_codes, dtype=np.uint8)[positions]
+        by_code = np.bincount(codes, weights=hours, minlength=len(self.entries.categories))
+        total_hours = round(float(hours.sum()), 2)
+        return {
+            'entries': len(positions),
+            'hours': total_hours,
+            'amount': round(total_hours * self.hourly_rate if self.tariff is None
+                            else float(amounts[positions].sum()), 2),
+            'categories': {cat: round(float(value), 2) for cat, value in zip(self.entries.categories, by_code.tolist())
+                           if self.category_filter is None or cat in self.category_filter}
+        }
+
+    def check_durations(self, positions=None):
+        """Vérifie les durées (de toutes les entrées, ou des positions données)
+        
+        Retourne le total des heures et la liste des problèmes.
+        """
+        total_duration, issues = self.duration_issues(positions)
+        return total_duration, [f"Entrée {entry_id}: {message}" for _, entry_id, _, _, message in issues]
+
+    def duration_issues(self, positions=None):
+        """Vérifie les durées et repère les chevauchements (de toutes les entrées, ou des positions données)
+        
+        Retourne le total des heures et la liste des problèmes, par ordre chronologique :
+        tuples (clé, ID, début en minutes, type de problème, détail).
+        """
+        issues = []
+        entries = self.entries
+        
+        # Vérifier les entrées en lot, puis détailler uniquement celles qui posent problème
+        hours, _, flags = compute_durations(self.entries)
+        if positions is not None:
+            selected = np.zeros(len(flags), dtype=bool)
+            selected[positions] = True
+            hours = np.where(selected, hours, 0.0)
+            flags = np.where(selected, flags, 0)
+        total_duration = float(hours.sum())
+        
+        for index in np.flatnonzero(flags).tolist():
+            raw_duration = (entries.ends[index] - entries.starts[index]) / 60
+            final_duration = hours[index]
+            flag = flags[index]
+            
+            if flag & DURATION_INVALID:
+                problem = ("Durée invalide", f"Durée brute invalide ({raw_duration:.2f}h)")
+            elif flag & DURATION_TOO_LONG:
+                problem = ("Durée > 24h", f"Durée brute supérieure à 24h ({raw_duration:.2f}h)")
+            elif flag & DURATION_EMPTY:
+                problem = ("Durée nulle", f"Durée finale nulle ou négative ({final_duration:.2f}h)")
+            else:
+                problem = ("Pause", f"Grande différence entre durée brute ({raw_duration:.2f}h) et finale ({final_duration:.2f}h)")
+            issues.append((entries.keys[index], entries.ids[index], entries.starts[index]) + problem)
+        
+        # Chevauchements et doublons entre entrées
+        for index, other, duplicate in zip(*(values.tolist() for values in find_overlaps(entries, positions))):
+            other_id = entries.ids[other]
+            if duplicate:
+                problem = ("Doublon", f"Mêmes horaires que l'entrée {other_id}")
+            else:
+                problem = ("Chevauchement", f"Chevauche l'entrée {other_id} ({format_date(entries.starts[other])} "
+                                            f"{format_time(entries.starts[other])}-{format_time(entries.ends[other])})")
+            issues.append((entries.keys[index], entries.ids[index], entries.starts[index]) + problem)
+        
+        issues.sort(key=lambda issue: issue[2])
+        return total_duration, issues
+
+    def export_pipeline(self, columns, numeric=False):
+        """Prépare un export des entrées filtrées, par ordre chronologique
+        
+        columns : noms des colonnes à exporter (voir EXPORT_COLUMNS), dans l'ordre voulu.
+        numeric=True garde la durée et le montant en nombres (tableurs).
+        """
+        entries = self.entries.copy()
+        positions = self.active_positions()
+        hours, amounts, _ = compute_durations(entries, self.hourly_rate, self.tariff)
+        return ExportPipeline(entries, positions, hours[positions].tolist(), amounts[positions].tolist(),
+                              columns, numeric)
+
+    def chart_data(self, granularity='jour'):
+        """Retourne les périodes (datetime64), heures et gains des entrées filtrées, regroupés par jour, semaine ou mois
+        
+        Sans filtre de dates, lit les totaux par période tenus à jour par le stockage : le coût
+        dépend du nombre de périodes et non du nombre d'entrées. Avec un filtre, les périodes en
+        bord de plage ne sont couvertes qu'en partie : seules les entrées filtrées sont regroupées,
+        comme dans les totaux. Les gains utilisent les taux par catégorie ; avec des majorations,
+        ils sont calculés en lot par entrée puis regroupés par période.
+        """
+        categories = self.entries.categories
+        rates = np.array([self.category_rates.get(cat, 0.0) for cat in categories])
+        if self.date_filter is not None:
+            positions = np.array(self.active_positions(), dtype=np.int64)
+            starts = np.frombuffer(self.entries.starts, dtype=np.int64)[positions]
+            # Chaque entrée compte pour la période de son début, durée arrondie comme dans les totaux
+            days, rows = np.unique(period_starts(starts // 1440, granularity), return_inverse=True)
+            hours = np.round(np.frombuffer(self.entries.minutes, dtype=np.int64)[positions] * 100 / 60) / 100
+            if self.tariff is None:
+                codes = np.frombuffer(self.entries.category_codes, dtype=np.uint8)[positions]
+                amounts = hours * rates[codes] if len(rates) else np.zeros_like(hours)
+            else:
+                _, amounts, _ = compute_durations(self.entries, self.category_rates, self.tariff)
+                amounts = amounts[positions]
+            hours = np.bincount(rows, weights=hours, minlength=len(days))
+            earnings = np.bincount(rows, weights=amounts, minlength=len(days))
+            return days.astype('datetime64[D]'), np.round(hours, 2), np.round(earnings, 2)
+        
+        days, hours = self.entries.rollup(granularity)
+        days = np.array(days, dtype=np.int64)
+        if self.category_filter is not None:
+            wanted = np.array([cat in self.category_filter for cat in categories], dtype=bool)
+            hours = hours * wanted
+        if self.tariff is None:
+            earnings = hours @ rates
+        else:
+            # Chaque entrée compte pour la période de son début, comme dans les totaux par période
+            _, amounts, _ = compute_durations(self.entries, self.category_rates, self.tariff)
+            positions = np.array(self.active_positions(), dtype=np.int64)
+            entry_days = period_starts(np.frombuffer(self.entries.starts, dtype=np.int64)[positions] // 1440,
+                                       granularity)
+            # Sans filtre de dates, la période de chaque entrée figure dans les totaux
+            rows = np.searchsorted(days, entry_days)
+            earnings = np.bincount(rows, weights=amounts[positions], minlength=len(days))
+        return days.astype('datetime64[D]'), np.round(hours.sum(axis=1), 2), np.round(earnings, 2)
+
+    def settings_data(self):
+        """Retourne les paramètres sauvegardés avec les entrées"""
+        data = {
+            'categories': list(self.categories),
+            'category_rates': dict(self.category_rates),
+            'hourly_rate': self.hourly_rate,
+            'tariff_rules': dict(self.tariff_rules)
+        }
+        data.update(self.preferences)
+        return data
+
+    def load(self, period=None):
+        """Charge l'instantané et rejoue le journal ; lève FileNotFoundError sans données
+        
+        period (début, fin en minutes) : avec SQLite, seules les entrées qui chevauchent
+        cette période sont lues, en lecture seule (ligne de commande).
+        """
+        if period is not None and isinstance(self.storage, SqliteStorage):
+            data, ops = self.storage.load(*period)
+        else:
+            data, ops = self.storage.load()
+        self.categories = data.get('categories', self.categories)
+        entries = data.get('entries', [])
+        if isinstance(entries, EntryStore):
+            self.entries = entries
+        else:
+            self.entries = EntryStore.from_dicts(entries, self.categories)
+        
+        # Rejouer le journal : entrées et paramètres modifiés depuis l'instantané
+        for op in ops:
+            if op['op'] == 'settings':
+                data.update(op['data'])
+            else:
+                self.entries.replay(op)
+        self.entries.pop_journal()
+        self.category_rates = data.get('category_rates', {cat: 0.0 for cat in self.categories})
+        for name, default in self.preferences.items():
+            self.preferences[name] = data.get(name, default)
+        self.hourly_rate = data.get('hourly_rate', 0.0)
+        try:
+            self.set_tariff_rules(data.get('tariff_rules', {}))
+        except ValueError as e:
+            logger.warning("Règles de majoration ignorées: %s", e)
+            self.set_tariff_rules({})
+        self._saved_settings = self.settings_data()
+        
+        # Garantir l'unicité des IDs (ils ne changent plus ensuite) ; la renumérotation est sauvegardée
+        renumbered = self.entries.ensure_unique_ids()
+        
+        # Intégrer le journal rejoué et les IDs renumérotés dans un nouvel instantané
+        if self.storage.journal_length or renumbered:
+            self.compact()
+
+    def save(self):
+        """Envoie les modifications en attente au journal, ou compacte l'instantané"""
+        ops = self.entries.pop_journal()
+        settings = self.settings_data()
+        if settings != self._saved_settings:
+            ops.append({'op': 'settings', 'data': settings})
+            self._saved_settings = settings
+        
+        if ops:
+            self.persistence.save(ops=ops)
+            self._journal_ops += len(ops)
+        if self._journal_ops >= self.storage.compact_threshold:
+            self.compact()
+
+    def compact(self):
+        """Demande la réécriture de l'instantané complet et la remise à zéro du journal"""
+        # Copie des colonnes : la conversion se fait dans le thread d'écriture
+        data = self.settings_data()
+        data['entries'] = self.entries.copy()
+        self.entries.pop_journal()
+        self.persistence.save(snapshot=data)
+        self._journal_ops = 0
+
+    def start(self):
+        """Démarre le thread d'écriture"""
+        self.persistence.start()
+
+    def flush(self, wait=False, timeout=None):
+        """Écrit immédiatement les sauvegardes en attente"""
+        self.persistence.flush(wait=wait, timeout=timeout)
+
+    def close(self, timeout=10):
+        """Sauvegarde et attend la fin des écritures en attente"""
+        self.save()
+        self.flush(wait=True, timeout=timeout)
+
+
+def write_csv(filename, pipeline):
+    """Écrit un export (voir ExportPipeline) dans un fichier CSV, ligne par ligne"""
+    import csv
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(pipeline.headers)
+        writer.writerows(pipeline.rows())
+        writer.writerow(pipeline.totals_row())
+
+
+class ExportCancelled(Exception):
+    """Export interrompu à la demande de l'utilisateur"""
+
+
+class FlowableFeed(list):
+    """Liste de flowables reportlab remplie à la demande depuis un itérable
+    
+    reportlab consomme la liste par le début : seuls quelques tableaux existent à la fois.
+    """
+    
+    def __init__(self, flowables):
+        super().__init__()
+        self._source = iter(flowables)
+        
+    def __len__(self):
+        if list.__len__(self) < 2:
+            self.extend(islice(self._source, 2))
+        return list.__len__(self)
+
+
+# Lignes par tableau du PDF (environ une page A4)
+PDF_CHUNK_ROWS = 40
+
+def write_pdf(filename, pipeline, progress=None, cancel=None):
+    """Écrit un export (voir ExportPipeline) dans un rapport PDF (reportlab)
+    
+    Les lignes sont lues par paquets de PDF_CHUNK_ROWS, chacun mis en page dans un
+    LongTable qui répète l'en-tête. progress(lignes écrites, nombre de lignes) est
+    appelé après chaque paquet ; si l'événement cancel est positionné, l'export s'arrête
+    (ExportCancelled) et le fichier incomplet est supprimé.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    
+    # Créer le document
+    doc = SimpleDocTemplate(filename, pagesize=A4)
+    styles = getSampleStyleSheet()
+    
+    # Titre
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30
+    )
+    
+    # Style commun des tableaux ; largeurs fixes pour aligner les colonnes d'un paquet à l'autre
+    table_style = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]
+    headers = pipeline.headers
+    col_widths = [doc.width / max(len(headers), 1)] * len(headers)
+    
+    def flowables():
+        yield Paragraph("Rapport des heures travaillées", title_style)
+        yield Spacer(1, 20)
+        
+        source = pipeline.rows()
+        chunk = list(islice(source, PDF_CHUNK_ROWS))
+        written = 0
+        while True:
+            if cancel is not None and cancel.is_set():
+                raise ExportCancelled()
+            following = list(islice(source, PDF_CHUNK_ROWS))
+            style = list(table_style)
+            if not following:
+                # Dernier paquet : ajouter les totaux
+                chunk.append(pipeline.totals_row())
+                style.append(('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey))
+            table = LongTable([headers] + chunk, colWidths=col_widths, repeatRows=1)
+            table.setStyle(TableStyle(style))
+            yield table
+            written += len(chunk) - (0 if following else 1)
+            if progress is not None:
+                progress(written, pipeline.count)
+            if not following:
+                break
+            chunk = following
+    
+    # Générer le PDF
+    try:
+        doc.build(FlowableFeed(flowables()))
+    except ExportCancelled:
+        if os.path.exists(filename):
+            os.remove(filename)
+        raise
+
+
+# Regroupements possibles des feuilles d'un export Excel
+XLSX_GROUPS = ('mois', 'catégorie')
+
+def write_xlsx(filename, pipeline, group_by='mois', progress=None, cancel=None):
+    """Écrit un export (voir ExportPipeline, numeric=True) dans un classeur Excel
+    
+    Classeur openpyxl en écriture seule : les lignes sont écrites au fur et à mesure, en mémoire
+    constante. Une feuille par mois ou par catégorie (group_by), chacune terminée par sa
+    ligne de totaux ; durée et montant sont des cellules numériques.
+    progress et cancel fonctionnent comme pour write_pdf.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    
+    workbook = Workbook(write_only=True)
+    headers = pipeline.headers
+    formats = {'Durée': '0.00', 'Montant': '#,##0.00 "€"'}
+    numeric_columns = [(index, formats[col]) for index, col in enumerate(headers) if col in formats]
+    hours_index = headers.index('Durée') if 'Durée' in headers else None
+    amount_index = headers.index('Montant') if 'Montant' in headers else None
+    bold = Font(bold=True)
+    # Feuille de chaque groupe et ses totaux [heures, montant]
+    sheets = {}
+    
+    def open_sheet(group):
+        # Titre de feuille : 31 caractères au plus, sans []:*?/\
+        title = ''.join(' ' if char in '[]:*?/\\' else char for char in str(group))[:31] or 'Export'
+        sheet = workbook.create_sheet(title=title)
+        header_cells = []
+        for col in headers:
+            cell = WriteOnlyCell(sheet, value=col)
+            cell.font = bold
+            header_cells.append(cell)
+        sheet.append(header_cells)
+        sheets[group] = (sheet, [0.0, 0.0])
+        return sheets[group]
+    
+    def formatted(sheet, row):
+        for index, number_format in numeric_columns:
+            cell = WriteOnlyCell(sheet, value=row[index])
+            cell.number_format = number_format
+            row[index] = cell
+        return row
+    
+    rows = pipeline.rows(group_by) if group_by else (('Export', row) for row in pipeline.rows())
+    for written, (group, row) in enumerate(rows, 1):
+        sheet, totals = sheets.get(group) or open_sheet(group)
+        if hours_index is not None:
+            totals[0] += row[hours_index]
+        if amount_index is not None:
+            totals[1] += row[amount_index]
+        sheet.append(formatted(sheet, row))
+        if written % 1000 == 0:
+            if cancel is not None and cancel.is_set():
+                raise ExportCancelled()
+            if progress is not None:
+                progress(written, pipeline.count)
+    
+    if not sheets:
+        open_sheet('Export')
+    
+    # Ligne des totaux de chaque feuille
+    for sheet, (total_hours, total_amount) in sheets.values():
+        row = [''] * len(headers)
+        if headers:
+            row[0] = 'Total'
+        if hours_index is not None:
+            row[hours_index] = round(total_hours, 2)
+        if amount_index is not None:
+            row[amount_index] = round(total_amount, 2)
+        sheet.append(formatted(sheet, row))
+    
+    # Le fichier n'est créé qu'à l'enregistrement : une annulation ne laisse rien sur le disque
+    if cancel is not None and cancel.is_set():
+        raise ExportCancelled()
+    workbook.save(filename)
+    if progress is not None:
+        progress(pipeline.written, pipeline.count)
+
+
+# Lignes par image PNG et résolution par défaut
+PNG_ROWS_PER_PAGE = 40
+PNG_DPI = 150
+
+def render_png_page(filename, headers, rows, totals, title, dpi):
+    """Dessine une page d'export PNG (moteur Agg, sans pyplot ; exécuté dans un processus du pool)"""
+    from matplotlib.figure import Figure
+    
+    # Taille fixe : 0,3 pouce par ligne, largeur des colonnes selon leur texte le plus long
+    cell_text = [headers] + rows + ([totals] if totals is not None else [])
+    widths = [max(len(str(row[col])) for row in cell_text) + 2 for col in range(len(headers))]
+    height = 0.3 * len(cell_text)
+    fig = Figure(figsize=(max(0.1 * sum(widths), 6), height + 0.8))
+    ax = fig.add_axes([0.02, 0.1 / (height + 0.8), 0.96, height / (height + 0.8)])
+    ax.axis('off')
+    
+    # Créer le tableau, étendu à tout l'axe (pas de calcul de mise en page par cellule)
+    table = ax.table(cellText=cell_text,
+                   cellLoc='center',
+                   colWidths=[width / sum(widths) for width in widths],
+                   bbox=[0, 0, 1, 1])
+    
+    # Styliser le tableau
+    table.auto_set_font_size(False)
+    table.set_fontsize(9)
+    
+    # Ajouter un titre
+    ax.set_title(title, pad=10)
+    
+    # Sauvegarder l'image (taille déjà ajustée : pas de bbox_inches='tight', qui dessine deux fois)
+    fig.savefig(filename, dpi=dpi)
+    return filename
+
+
+def write_png(filename, pipeline, rows_per_page=PNG_ROWS_PER_PAGE, dpi=PNG_DPI, workers=None,
+              progress=None, cancel=None):
+    """Écrit un export (voir ExportPipeline) en images PNG de rows_per_page lignes
+    
+    rapport.png donne rapport_001.png, rapport_002.png, ... ; la dernière page porte les totaux.
+    Les pages sont dessinées en parallèle dans un pool de processus (au plus workers, tous les
+    cœurs par défaut), avec au plus deux pages en attente par processus pour borner la mémoire.
+    progress(lignes écrites, nombre de lignes) et cancel fonctionnent comme pour write_pdf.
+    Retourne la liste des fichiers écrits.
+    """
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    import multiprocessing
+    
+    stem, extension = os.path.splitext(filename)
+    pages = max(1, -(-pipeline.count // rows_per_page))
+    workers = min(workers or os.cpu_count() or 1, pages)
+    source = pipeline.rows()
+    
+    def page_tasks():
+        for number in range(1, pages + 1):
+            rows = list(islice(source, rows_per_page))
+            totals = pipeline.totals_row() if number == pages else None
+            title = "Rapport des heures travaillées" + (f" ({number}/{pages})" if pages > 1 else "")
+            yield (f"{stem}_{number:03d}{extension or '.png'}", pipeline.headers, rows, totals, title, dpi), len(rows)
+    
+    written_files = []
+    # Toutes les pages confiées au dessin, terminées ou non : à supprimer en cas d'annulation
+    submitted = []
+    written_rows = 0
+    try:
+        if workers == 1:
+            # Une seule page ou un seul processus : pas de pool
+            for task, row_count in page_tasks():
+                if cancel is not None and cancel.is_set():
+                    raise ExportCancelled()
+                submitted.append(task[0])
+                written_files.append(render_png_page(*task))
+                written_rows += row_count
+                if progress is not None:
+                    progress(written_rows, pipeline.count)
+            return written_files
+        
+        # Processus lancés par « spawn » : sûr même depuis un thread de l'interface Tk
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = {}
+            tasks = page_tasks()
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < 2 * workers:
+                    item = next(tasks, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    task, row_count = item
+                    submitted.append(task[0])
+                    pending[pool.submit(render_png_page, *task)] = row_count
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    written_files.append(future.result())
+                    written_rows += pending.pop(future)
+                if progress is not None:
+                    progress(written_rows, pipeline.count)
+                if cancel is not None and cancel.is_set():
+                    for future in pending:
+                        future.cancel()
+                    raise ExportCancelled()
+        return sorted(written_files)
+    except ExportCancelled:
+        # La sortie du bloc with a attendu les pages en cours : elles sont toutes sur le disque
+        for path in submitted:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
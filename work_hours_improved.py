@@ -1,12 +1,19 @@
+import time
+# Début du chargement du module, origine des mesures du rapport de démarrage
+STARTED_AT = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from datetime import datetime, timedelta
-import os
+from datetime import datetime
+from array import array
 import locale
-import json
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import customtkinter as ctk
+import os
+import threading
+# Matplotlib est importé à la première ouverture de l'onglet Statistiques, reportlab à l'export
+from work_hours_engine import (ROLLUP_GRANULARITIES, EntryView, ExportCancelled, WorkHoursEngine,
+                               anchor_breaks, compute_durations, format_date, format_time,
+                               longest_increasing_subsequence, parse_break_ranges,
+                               PNG_DPI, XLSX_GROUPS, write_pdf, write_png, write_xlsx)
+IMPORTS_DONE_AT = time.perf_counter()
 
 # Configurer la locale française
 try:
@@ -20,6 +27,14 @@ except:
         except:
             pass
 
+# Au-delà de ce nombre d'entrées, le tableau n'affiche que la fenêtre visible
+VIRTUAL_TABLE_THRESHOLD = 5000
+# Lignes chargées de part et d'autre de la fenêtre visible en mode virtuel
+TABLE_BUFFER_ROWS = 50
+# Lignes affichées par page dans le tableau des problèmes détectés
+ISSUES_PAGE_ROWS = 500
+
+
 class WorkHoursApp:
     def __init__(self, root):
         self.root = root
@@ -50,9 +65,9 @@ class WorkHoursApp:
         }
         
         # Variables pour les catégories et taux
-        self.categories = ["Travail normal", "Travail de nuit", "Heures supplémentaires", "Week-end"]
-        self.category_rates = {cat: 0.0 for cat in self.categories}
-        self.current_category = tk.StringVar(value=self.categories[0])
+        # Données et calculs : moteur sans interface, sauvegardé par un thread dédié
+        self.engine = WorkHoursEngine('work_hours_data', on_error=self.report_save_error)
+        self.current_category = tk.StringVar(value=self.engine.categories[0])
         self.hourly_rate = tk.DoubleVar(value=0.0)  # Tarif horaire par défaut
         
         # Variables pour les pauses
@@ -64,18 +79,66 @@ class WorkHoursApp:
         
         # Variables existantes
         self.is_night_shift = tk.BooleanVar(value=False)
-        self.current_id = 0
-        self.entries = []
         self.editing_id = None
         
+        # Valeurs actuellement affichées dans le tableau, par identifiant de ligne
+        self._rendered_rows = {}
+        
+        # Saisie de la période filtrée
+        self.filter_start = tk.StringVar()
+        self.filter_end = tk.StringVar()
+        
+        # Mode virtuel du tableau : seule une fenêtre de lignes est matérialisée
+        self.virtual_table = False
+        self._table_keys = array('q')
+        self._table_window = (0, 0)
+        self._table_top = 0
+        self._table_hours = []
+        self._table_amounts = []
+        self._offscreen_selection = set()
+        self._rewindow_pending = False
+        
+        # Planificateur des mises à jour différées (regroupées par tour de boucle Tk)
+        self._pending_tasks = set()
+        self._requested_tasks = 0
+        self._flush_scheduled = False
+        self.coalesced_passes = 0
+        
+        # Export en cours dans un thread et son signal d'annulation
+        self.export_thread = None
+        self.export_cancel = None
+        # Fermeture demandée : plus de message de fin d'export
+        self.closing = False
+        
+        # Durées des étapes du démarrage (secondes), complétées au premier affichage
+        self.startup_times = {'imports': IMPORTS_DONE_AT - STARTED_AT}
+        
         # Création de l'interface
+        step_start = time.perf_counter()
         self.create_interface()
         
         # Configuration des raccourcis clavier
         self.setup_shortcuts()
+        self.startup_times['interface'] = time.perf_counter() - step_start
         
         # Charger les données sauvegardées
+        step_start = time.perf_counter()
         self.load_data()
+        self.startup_times['chargement'] = time.perf_counter() - step_start
+        
+        # Démarrer l'écriture en arrière-plan (le chargement lit le stockage directement)
+        self.engine.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # Les dessins des widgets sont en attente : ce rappel passe après eux
+        self.root.after_idle(self.report_startup)
+        
+    def report_startup(self):
+        """Affiche le rapport de démarrage une fois la fenêtre dessinée"""
+        self.root.update_idletasks()
+        self.startup_times['premier affichage'] = time.perf_counter() - STARTED_AT
+        print("Démarrage : " + ", ".join(f"{step} {seconds * 1000:.0f} ms"
+                                          for step, seconds in self.startup_times.items()))
         
     def get_theme_color(self, color_key):
         theme = 'dark' if self.is_dark_mode.get() else 'light'
@@ -95,7 +158,19 @@ class WorkHoursApp:
         # Barre de progression
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(self.root, variable=self.progress_var, mode='determinate')
-        self.progress_bar.pack(fill=tk.X, padx=20, pady=(0, 20))
+        self.progress_bar.pack(fill=tk.X, padx=20, pady=(0, 5))
+        
+        # Bouton d'annulation, affiché pendant un export
+        self.cancel_export_btn = tk.Button(self.root, text="Annuler l'export",
+                                         command=self.cancel_export,
+                                         bg=self.get_theme_color('button'),
+                                         fg=self.get_theme_color('button_fg'))
+        
+        # Compteur des passes évitées par le planificateur
+        self.scheduler_label = tk.Label(self.root, text="Passes regroupées : 0",
+                                      bg=self.get_theme_color('bg'),
+                                      fg=self.get_theme_color('fg'))
+        self.scheduler_label.pack(anchor=tk.E, padx=20, pady=(0, 10))
         
         # Afficher/masquer les champs de pause après la création de l'interface
         self.toggle_break_fields()
@@ -119,6 +194,11 @@ class WorkHoursApp:
                                bg=self.get_theme_color('button'), fg=self.get_theme_color('button_fg'))
         category_btn.pack(side=tk.LEFT, padx=5)
         
+        # Règles de majoration (nuit, week-end, jours fériés, heures supplémentaires)
+        tariff_btn = tk.Button(toolbar, text="💶 Majorations", command=self.show_tariff_settings,
+                             bg=self.get_theme_color('button'), fg=self.get_theme_color('button_fg'))
+        tariff_btn.pack(side=tk.LEFT, padx=5)
+        
         # Bouton pour vérifier les durées
         verify_btn = tk.Button(toolbar, text="🔍 Vérifier les durées",
                              command=self.check_all_durations,
@@ -167,6 +247,13 @@ class WorkHoursApp:
                           fg=self.get_theme_color('button_fg'))
         add_btn.pack(side=tk.LEFT, padx=5)
         
+        # Bouton pour importer des entrées depuis un fichier CSV
+        import_btn = tk.Button(controls_frame, text="📥 Importer CSV",
+                             command=self.import_csv,
+                             bg=self.get_theme_color('button'),
+                             fg=self.get_theme_color('button_fg'))
+        import_btn.pack(side=tk.LEFT, padx=5)
+        
         # Bouton pour modifier une entrée
         edit_btn = tk.Button(controls_frame, text="✏️ Modifier",
                            command=self.edit_selected,
@@ -242,6 +329,35 @@ class WorkHoursApp:
                                          fg=self.get_theme_color('fg'))
         self.total_amount_label.pack(side=tk.LEFT, padx=10, pady=5)
         
+        # Frame pour le filtrage par plage de dates
+        filter_frame = tk.LabelFrame(parent, text="Période",
+                                   bg=self.get_theme_color('bg'),
+                                   fg=self.get_theme_color('fg'))
+        filter_frame.pack(fill=tk.X, pady=5)
+        
+        tk.Label(filter_frame, text="Du (AAAA-MM-JJ):",
+                bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(side=tk.LEFT, padx=5)
+        tk.Entry(filter_frame, textvariable=self.filter_start, width=12,
+                bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(side=tk.LEFT, padx=5, pady=5)
+        
+        tk.Label(filter_frame, text="Au:",
+                bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(side=tk.LEFT, padx=5)
+        tk.Entry(filter_frame, textvariable=self.filter_end, width=12,
+                bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(side=tk.LEFT, padx=5, pady=5)
+        
+        tk.Button(filter_frame, text="Filtrer",
+                 command=self.apply_date_filter,
+                 bg=self.get_theme_color('button'),
+                 fg=self.get_theme_color('button_fg')).pack(side=tk.LEFT, padx=5)
+        tk.Button(filter_frame, text="Tout afficher",
+                 command=self.clear_date_filter,
+                 bg=self.get_theme_color('button'),
+                 fg=self.get_theme_color('button_fg')).pack(side=tk.LEFT, padx=5)
+        
         # Mettre à jour les totaux
         self.update_totals()
         
@@ -275,9 +391,14 @@ class WorkHoursApp:
         self.tree.column('catégorie', width=120)
         self.tree.column('montant', width=100)
         
-        # Ajouter une barre de défilement
-        scrollbar = ttk.Scrollbar(entries_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # Ajouter une barre de défilement (reliée au tableau complet, même en mode virtuel)
+        scrollbar = ttk.Scrollbar(entries_frame, orient=tk.VERTICAL, command=self.on_table_scroll)
+        self.tree.configure(yscrollcommand=self.on_tree_yview)
+        self.table_scrollbar = scrollbar
+        
+        # Suivi de la sélection et du redimensionnement pour le mode virtuel
+        self.tree.bind('<Button-1>', self.on_tree_click, add='+')
+        self.tree.bind('<Configure>', lambda e: self.rewindow_table())
         
         # Placer le tableau et la barre de défilement
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -355,13 +476,68 @@ class WorkHoursApp:
             self.break_fields_frame.pack_forget()
 
     def setup_stats_tab(self, parent):
-        # Création du graphique
+        # Choix du regroupement des totaux affichés
+        granularity_frame = tk.Frame(parent, bg=self.get_theme_color('bg'))
+        granularity_frame.pack(fill=tk.X, padx=5, pady=5)
+        tk.Label(granularity_frame, text="Regrouper par :", bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(side=tk.LEFT, padx=5)
+        self.chart_granularity = tk.StringVar(value='jour')
+        granularity_combo = ttk.Combobox(granularity_frame, textvariable=self.chart_granularity,
+                                       values=ROLLUP_GRANULARITIES, state="readonly", width=10)
+        granularity_combo.pack(side=tk.LEFT, padx=5)
+        granularity_combo.bind('<<ComboboxSelected>>', lambda e: self.update_chart())
+        
+        # Le graphique est créé à la première ouverture de l'onglet
+        self.stats_tab = parent
+        self.fig = None
+        self.canvas = None
+        # Graphique en retard sur les données (mis à jour à l'affichage de l'onglet)
+        self._chart_stale = True
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_tab_changed)
+        
+    def on_tab_changed(self, event):
+        """Crée et met à jour le graphique quand l'onglet Statistiques est affiché"""
+        if self.chart_visible():
+            if self.fig is None:
+                self.create_chart()
+            if self._chart_stale:
+                self.update_chart()
+            
+    def chart_visible(self):
+        """Indique si l'onglet Statistiques est affiché"""
+        return self.notebook.select() == str(self.stats_tab)
+            
+    def create_chart(self):
+        """Importe Matplotlib et crée le graphique de l'onglet Statistiques"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
+        # Création du graphique : axes et courbes créés une fois, puis mis à jour par set_data
         self.fig = Figure(figsize=(8, 6))
-        self.canvas = FigureCanvasTkAgg(self.fig, master=parent)
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.stats_tab)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
+        # Graphique des heures travaillées
+        ax1 = self.fig.add_subplot(211)
+        self.hours_line, = ax1.plot([], [], 'b-', marker='o')
+        ax1.set_ylabel('Heures')
+        ax1.grid(True)
+        ax1.xaxis_date()
+        
+        # Graphique des gains
+        ax2 = self.fig.add_subplot(212)
+        self.earnings_line, = ax2.plot([], [], 'g-', marker='o')
+        ax2.set_ylabel('Euros')
+        ax2.grid(True)
+        ax2.xaxis_date()
+        
+        # Mise en page calculée une seule fois
+        self.fig.tight_layout()
+        self.update_theme()
+        
+
     def setup_shortcuts(self):
-        self.root.bind('<Control-s>', lambda e: self.save_data())
+        self.root.bind('<Control-s>', lambda e: self.save_now())
         self.root.bind('<Control-n>', lambda e: self.add_entry())
         self.root.bind('<Control-d>', lambda e: self.delete_selected())
         self.root.bind('<Control-e>', lambda e: self.show_export_options())
@@ -414,6 +590,7 @@ class WorkHoursApp:
         
         # Mise à jour de tous les widgets
         update_widget(self.main_frame)
+        update_widget(self.scheduler_label)
         
         # Mise à jour des styles ttk
         style = ttk.Style()
@@ -422,8 +599,8 @@ class WorkHoursApp:
                       foreground=colors['fg'],
                       fieldbackground=colors['bg'])
         
-        # Mise à jour des graphiques
-        if hasattr(self, 'fig'):
+        # Mise à jour des graphiques (s'ils ont déjà été créés)
+        if self.fig is not None:
             self.fig.set_facecolor(colors['bg'])
             for ax in self.fig.axes:
                 ax.set_facecolor(colors['bg'])
@@ -447,211 +624,161 @@ class WorkHoursApp:
             
     def verify_duration(self, start_date, start_time, end_date, end_time):
         """Vérifie et corrige la durée entre deux dates/heures"""
-        print(f"Attempting to verify duration with: start_date={start_date}, start_time={start_time}, end_date={end_date}, end_time={end_time}")
-        try:
-            # Convertir en objets datetime
-            start = datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M")
-            end = datetime.strptime(f"{end_date} {end_time}", "%Y-%m-%d %H:%M")
-            
-            # Vérifier si la date de fin est avant la date de début
-            if end < start:
-                return False, "La date/heure de fin est antérieure à la date/heure de début"
-            
-            # Calculer la durée brute
-            duration = (end - start).total_seconds() / 3600
-            
-            # Vérifier si la durée est raisonnable (moins de 24h)
-            if duration > 24:
-                return False, "La durée ne peut pas dépasser 24 heures"
-            
-            # Vérifier si la durée est positive
-            if duration <= 0:
-                return False, "La durée doit être supérieure à 0"
-            
-            return True, duration
-            
-        except ValueError as e:
-            print(f"verify_duration ValueError: {e}")
-            return False, f"Format de date/heure invalide: {str(e)}"
-        except Exception as e:
-            print(f"verify_duration Exception: {e}")
-            return False, f"Erreur lors de la vérification: {str(e)}"
+        return self.engine.verify_duration(start_date, start_time, end_date, end_time)
 
     def calculate_duration(self, entry):
         """Calcule la durée de travail en tenant compte des pauses"""
-        try:
-            # Convertir les dates et heures en objets datetime
-            start = datetime.strptime(f"{entry['start_date']} {entry['start_time']}", "%Y-%m-%d %H:%M")
-            end = datetime.strptime(f"{entry['end_date']} {entry['end_time']}", "%Y-%m-%d %H:%M")
-            
-            # Vérifier si la date de fin est avant la date de début
-            if end < start:
-                print(f"Erreur: Date de fin antérieure à la date de début pour l'entrée {entry['id']}")
-                return 0.0
-            
-            # Calculer la durée totale en heures
-            duration = (end - start).total_seconds() / 3600
-            
-            # Vérifier si la durée est raisonnable (moins de 24h)
-            if duration > 24:
-                print(f"Attention: Durée supérieure à 24h pour l'entrée {entry['id']}")
-                return 0.0
-            
-            # Soustraire les pauses si elles sont activées pour cette entrée
-            if entry.get('has_break', False):
-                try:
-                    # Créer les objets datetime pour le début et la fin de la pause
-                    break_start = datetime.strptime(
-                        f"{entry['start_date']} {entry['break_start_hour']}:{entry['break_start_min']}",
-                        "%Y-%m-%d %H:%M"
-                    )
-                    break_end = datetime.strptime(
-                        f"{entry['start_date']} {entry['break_end_hour']}:{entry['break_end_min']}",
-                        "%Y-%m-%d %H:%M"
-                    )
-                    
-                    # Vérifier si la pause est dans la période de travail
-                    if break_start < end and break_end > start:
-                        # Ajuster les heures de pause si nécessaire
-                        if break_start < start:
-                            break_start = start
-                        if break_end > end:
-                            break_end = end
-                            
-                        # Calculer la durée de la pause
-                        break_duration = (break_end - break_start).total_seconds() / 3600
-                        
-                        # Vérifier que la pause ne dépasse pas la durée totale
-                        if break_duration > duration:
-                            print(f"Attention: Pause plus longue que la durée totale pour l'entrée {entry['id']}")
-                            break_duration = duration
-                        
-                        duration -= break_duration
-                        
-                        # Vérifier que la durée finale est positive
-                        if duration < 0:
-                            print(f"Attention: Durée négative après pause pour l'entrée {entry['id']}")
-                            duration = 0.0
-                            
-                except (ValueError, KeyError) as e:
-                    print(f"Erreur lors du calcul de la pause: {e}")
-                    pass  # Si les heures de pause ne sont pas valides, ignorer
-            
-            # Arrondir à 2 décimales
-            return round(duration, 2)
-            
-        except Exception as e:
-            print(f"Erreur lors du calcul de la durée: {e}")
-            return 0.0
+        return self.engine.calculate_duration(entry)
 
     def on_rate_change(self):
         """Méthode appelée quand le tarif horaire change"""
         try:
             # Vérifier que le tarif est un nombre valide
-            rate = float(self.hourly_rate.get())
-            if rate < 0:
-                self.hourly_rate.set(0)
-                rate = 0
-        except ValueError:
-            self.hourly_rate.set(0)
-            rate = 0
-        
-        # Mettre à jour l'affichage
-        self.refresh_entries()
-        self.update_totals()
+            value = self.hourly_rate.get()
+        except (tk.TclError, ValueError):
+            value = 0
+        rate = self.engine.set_hourly_rate(value)
+        if rate != value:
+            self.hourly_rate.set(rate)
+        
+        # Mettre à jour l'affichage et sauvegarder (une seule fois par tour de boucle)
+        self.schedule('table', 'totals', 'save')
+
+    def schedule(self, *tasks):
+        """Demande une mise à jour différée : 'table', 'totals', 'chart' et/ou 'save'
+        
+        Les demandes sont regroupées et exécutées au plus une fois chacune par tour de boucle Tk.
+        """
+        self._pending_tasks.update(tasks)
+        self._requested_tasks += len(tasks)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.root.after_idle(self.flush_pending)
+
+    def flush_pending(self):
+        """Exécute les mises à jour demandées depuis le dernier passage"""
+        tasks = self._pending_tasks
+        requested = self._requested_tasks
+        self._pending_tasks = set()
+        self._requested_tasks = 0
+        self._flush_scheduled = False
+        
+        executed = 0
+        if 'table' in tasks:
+            # refresh_entries met aussi à jour les totaux
+            self.refresh_entries()
+            executed += 1
+        elif 'totals' in tasks:
+            self.update_totals()
+            executed += 1
+        if 'chart' in tasks:
+            self.update_chart()
+            executed += 1
+        if 'save' in tasks:
+            self.save_data()
+            executed += 1
         
-        # Sauvegarder les données
-        self.save_data()
+        # Compter les passes évitées
+        self.coalesced_passes += requested - executed
+        self.scheduler_label.config(text=f"Passes regroupées : {self.coalesced_passes}")
 
-    def save_data(self):
-        # Convertir les données en format sérialisable
-        data = {
-            'entries': self.entries,
-            'categories': self.categories,
-            'category_rates': self.category_rates,
+    def store_preferences(self):
+        """Reporte dans le moteur les préférences de pause saisies dans l'interface"""
+        self.engine.preferences.update({
             'has_break': self.has_break.get(),
             'break_start_hour': self.break_start_hour.get(),
             'break_start_min': self.break_start_min.get(),
             'break_end_hour': self.break_end_hour.get(),
-            'break_end_min': self.break_end_min.get(),
-            'hourly_rate': self.hourly_rate.get()  # Sauvegarder le tarif horaire
-        }
-        
+            'break_end_min': self.break_end_min.get()
+        })
+
+    def save_data(self):
+        """Sauvegarde les modifications en attente dans le journal, ou compacte l'instantané"""
         try:
-            with open('work_hours_data.json', 'w') as f:
-                json.dump(data, f)
+            self.store_preferences()
+            self.engine.save()
         except Exception as e:
             messagebox.showerror("Erreur", f"Erreur lors de la sauvegarde : {str(e)}")
+
+    def save_now(self):
+        """Sauvegarde et écrit immédiatement sur le disque (Ctrl+S)"""
+        self.save_data()
+        self.engine.flush()
+
+    def report_save_error(self, error):
+        """Signale une erreur du thread d'écriture dans l'interface"""
+        self.root.after(0, lambda: messagebox.showerror("Erreur", f"Erreur lors de la sauvegarde : {error}"))
+
+    def on_close(self):
+        """Termine les écritures en attente avant de fermer la fenêtre"""
+        # Un export interrompu supprime son fichier incomplet : attendre la fin du thread sans
+        # bloquer la boucle Tk, par laquelle passent ses mises à jour (root.after)
+        self.closing = True
+        self.cancel_export()
+        if self.export_thread is not None and self.export_thread.is_alive():
+            self.root.after(50, self.on_close)
+            return
+        self.store_preferences()
+        self.engine.close(timeout=10)
+        self.root.destroy()
             
     def load_data(self):
         try:
-            with open('work_hours_data.json', 'r') as f:
-                data = json.load(f)
-                self.entries = data.get('entries', [])
-                self.categories = data.get('categories', self.categories)
-                self.category_rates = data.get('category_rates', {cat: 0.0 for cat in self.categories})
-                
-                # Charger les données de pause
-                self.has_break.set(data.get('has_break', False))
-                self.break_start_hour.set(data.get('break_start_hour', ''))
-                self.break_start_min.set(data.get('break_start_min', ''))
-                self.break_end_hour.set(data.get('break_end_hour', ''))
-                self.break_end_min.set(data.get('break_end_min', ''))
-                
-                # Charger le tarif horaire
-                self.hourly_rate.set(data.get('hourly_rate', 0.0))
-                
-                # Réorganiser les IDs au chargement
-                self.reorganize_ids()
-                
-                # Rafraîchir l'affichage
-                self.refresh_entries()
+            self.engine.load()
+            self._offscreen_selection.clear()
+            
+            # Afficher les préférences de pause et le tarif horaire chargés
+            preferences = self.engine.preferences
+            self.has_break.set(preferences['has_break'])
+            self.break_start_hour.set(preferences['break_start_hour'])
+            self.break_start_min.set(preferences['break_start_min'])
+            self.break_end_hour.set(preferences['break_end_hour'])
+            self.break_end_min.set(preferences['break_end_min'])
+            self.hourly_rate.set(self.engine.hourly_rate)
+            
+            # Rafraîchir l'affichage
+            self.schedule('table')
+
+            rejected = self.engine.entries.rejected
+            if rejected:
+                ids = ", ".join(str(entry.get('id')) for entry in rejected[:10])
+                messagebox.showwarning("Entrées illisibles",
+                                       f"{len(rejected)} entrée(s) illisible(s) (ID {ids}) ne sont pas affichées.\n"
+                                       "Elles sont conservées telles quelles dans le fichier de données : "
+                                       "corrigez-les dans le fichier pour les retrouver.")
         except FileNotFoundError:
             pass
         except Exception as e:
             messagebox.showerror("Erreur", f"Erreur lors du chargement : {str(e)}")
 
     def show_statistics(self):
-        # Effacer les graphiques existants
-        for ax in self.fig.axes:
-            ax.clear()
-        
-        # Créer deux sous-graphiques
-        ax1 = self.fig.add_subplot(211)
-        ax2 = self.fig.add_subplot(212)
-        
-        # Préparer les données
-        dates = []
-        hours = []
-        earnings = []
-        
-        for entry in self.entries:
-            date = datetime.strptime(entry['start_date'], "%Y-%m-%d")
-            duration = self.calculate_duration(entry)
-            rate = self.category_rates.get(entry.get('category', self.categories[0]), 0.0)
-            
-            dates.append(date)
-            hours.append(duration)
-            earnings.append(duration * rate)
-        
-        # Graphique des heures travaillées
-        ax1.plot(dates, hours, 'b-', marker='o')
-        ax1.set_title('Heures travaillées par jour')
-        ax1.set_ylabel('Heures')
-        ax1.grid(True)
-        
-        # Graphique des gains
-        ax2.plot(dates, earnings, 'g-', marker='o')
-        ax2.set_title('Gains par jour')
-        ax2.set_ylabel('Euros')
-        ax2.grid(True)
+        """Affiche l'onglet des statistiques, dont le graphique est mis à jour à l'affichage"""
+        self.notebook.select(1)  # Index 1 correspond à l'onglet Statistiques
+        self.on_tab_changed(None)
+
+    def update_chart(self):
+        """Met à jour les courbes pour les entrées de la période filtrée
         
-        # Ajuster la mise en page
-        self.fig.tight_layout()
-        self.canvas.draw()
+        Onglet masqué ou graphique pas encore créé : la mise à jour attend l'affichage de l'onglet.
+        """
+        self._chart_stale = True
+        if self.fig is None or not self.chart_visible():
+            return
         
-        # Afficher l'onglet des statistiques
-        self.notebook.select(1)  # Index 1 correspond à l'onglet Statistiques
+        # Totaux par période lus dans les regroupements du stockage, gains selon les taux par catégorie
+        granularity = self.chart_granularity.get()
+        dates, hours, earnings = self.engine.chart_data(granularity)
+        self.hours_line.set_data(dates, hours)
+        self.earnings_line.set_data(dates, earnings)
+        self.hours_line.axes.set_title(f'Heures travaillées par {granularity}')
+        self.earnings_line.axes.set_title(f'Gains par {granularity}')
+        for line in (self.hours_line, self.earnings_line):
+            line.axes.relim()
+            line.axes.autoscale_view()
+        
+        # Redessiner au prochain passage de la boucle Tk
+        self.canvas.draw_idle()
+        self._chart_stale = False
 
     def show_category_settings(self):
         # Créer une nouvelle fenêtre pour les paramètres des catégories
@@ -668,14 +795,14 @@ class WorkHoursApp:
         temp_rates = {}
         
         # Liste des catégories
-        for i, category in enumerate(self.categories):
+        for i, category in enumerate(self.engine.categories):
             frame = tk.Frame(categories_frame, bg=self.get_theme_color('bg'))
             frame.pack(fill=tk.X, pady=5)
             
             tk.Label(frame, text=category, bg=self.get_theme_color('bg'),
                     fg=self.get_theme_color('fg')).pack(side=tk.LEFT)
             
-            rate_var = tk.StringVar(value=str(self.category_rates.get(category, 0.0)))
+            rate_var = tk.StringVar(value=str(self.engine.category_rates.get(category, 0.0)))
             rate_entry = tk.Entry(frame, textvariable=rate_var, width=10,
                                 bg=self.get_theme_color('bg'),
                                 fg=self.get_theme_color('fg'))
@@ -693,57 +820,111 @@ class WorkHoursApp:
 
     def save_category_settings(self, window, temp_rates):
         # Mettre à jour les taux des catégories
-        new_rates = {}
-        for category, rate_var in temp_rates.items():
-            try:
-                new_rates[category] = float(rate_var.get())
-            except ValueError:
-                messagebox.showerror("Erreur", f"Le taux pour {category} n'est pas un nombre valide")
-                return
+        try:
+            self.engine.set_category_rates({category: rate_var.get() for category, rate_var in temp_rates.items()})
+        except ValueError as e:
+            messagebox.showerror("Erreur", str(e))
+            return
         
-        # Mettre à jour les taux
-        self.category_rates = new_rates
+        # Sauvegarder les données et rafraîchir l'affichage
+        self.schedule('table', 'save')
         
-        # Sauvegarder les données
-        self.save_data()
+        # Fermer la fenêtre
+        window.destroy()
+
+    def show_tariff_settings(self):
+        """Affiche les règles de majoration appliquées aux montants"""
+        rules = self.engine.tariff_rules
+        settings_window = tk.Toplevel(self.root)
+        settings_window.title("Majorations")
+        settings_window.geometry("420x420")
+        settings_window.configure(bg=self.get_theme_color('bg'))
         
-        # Rafraîchir l'affichage
-        self.refresh_entries()
+        fields_frame = tk.Frame(settings_window, bg=self.get_theme_color('bg'))
+        fields_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        # Fermer la fenêtre
+        enabled = tk.BooleanVar(value=rules['enabled'])
+        tk.Checkbutton(fields_frame, text="Appliquer les majorations", variable=enabled,
+                      bg=self.get_theme_color('bg'), fg=self.get_theme_color('fg'),
+                      selectcolor=self.get_theme_color('bg')).pack(anchor=tk.W, pady=5)
+        
+        # Champs texte : (libellé, clé de la règle, valeur affichée)
+        values = {}
+        for label, name, value in (
+                ("Début de la nuit (HH:MM):", 'night_start', rules['night_start']),
+                ("Fin de la nuit (HH:MM):", 'night_end', rules['night_end']),
+                ("Coefficient de nuit:", 'night_multiplier', rules['night_multiplier']),
+                ("Coefficient du week-end:", 'weekend_multiplier', rules['weekend_multiplier']),
+                ("Jours fériés (AAAA-MM-JJ, ...):", 'holidays', ", ".join(rules['holidays'])),
+                ("Coefficient des jours fériés:", 'holiday_multiplier', rules['holiday_multiplier']),
+                ("Heures supplémentaires au-delà de (h):", 'overtime_hours', rules['overtime_hours']),
+                ("Majoration des heures supplémentaires:", 'overtime_multiplier', rules['overtime_multiplier'])):
+            frame = tk.Frame(fields_frame, bg=self.get_theme_color('bg'))
+            frame.pack(fill=tk.X, pady=2)
+            tk.Label(frame, text=label, bg=self.get_theme_color('bg'),
+                    fg=self.get_theme_color('fg')).pack(side=tk.LEFT)
+            values[name] = tk.StringVar(value=str(value))
+            tk.Entry(frame, textvariable=values[name], width=12 if name != 'holidays' else 24,
+                    bg=self.get_theme_color('bg'), fg=self.get_theme_color('fg')).pack(side=tk.RIGHT)
+        
+        # Jours du week-end (0 : lundi ... 6 : dimanche)
+        days_frame = tk.Frame(fields_frame, bg=self.get_theme_color('bg'))
+        days_frame.pack(fill=tk.X, pady=5)
+        weekend_days = {}
+        for day, name in enumerate(("Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim")):
+            weekend_days[day] = tk.BooleanVar(value=day in rules['weekend_days'])
+            tk.Checkbutton(days_frame, text=name, variable=weekend_days[day],
+                          bg=self.get_theme_color('bg'), fg=self.get_theme_color('fg'),
+                          selectcolor=self.get_theme_color('bg')).pack(side=tk.LEFT)
+        
+        save_btn = tk.Button(settings_window, text="Sauvegarder",
+                           command=lambda: self.save_tariff_settings(settings_window, enabled, values, weekend_days),
+                           bg=self.get_theme_color('button'),
+                           fg=self.get_theme_color('button_fg'))
+        save_btn.pack(pady=10)
+
+    def save_tariff_settings(self, window, enabled, values, weekend_days):
+        """Compile et applique les règles de majoration saisies"""
+        rules = {name: var.get().strip() for name, var in values.items()}
+        rules['holidays'] = [day.strip() for day in rules['holidays'].split(',') if day.strip()]
+        rules['weekend_days'] = [day for day, var in weekend_days.items() if var.get()]
+        rules['enabled'] = enabled.get()
+        try:
+            for name in ('night_multiplier', 'weekend_multiplier', 'holiday_multiplier',
+                         'overtime_hours', 'overtime_multiplier'):
+                try:
+                    rules[name] = float(rules[name].replace(',', '.'))
+                except ValueError:
+                    raise ValueError(f"La valeur « {rules[name]} » n'est pas un nombre valide")
+            self.engine.set_tariff_rules(rules)
+        except ValueError as e:
+            messagebox.showerror("Erreur", str(e))
+            return
+        
+        # Montants du tableau, totaux et gains du graphique recalculés, puis sauvegarde
+        self.schedule('table', 'totals', 'chart', 'save')
         window.destroy()
 
     def get_suggested_times(self):
         """Retourne les dates et heures suggérées basées sur les entrées récentes"""
-        if not self.entries:
+        if not self.engine.entries:
             today = datetime.now()
             return today.strftime("%Y-%m-%d"), "09:00", today.strftime("%Y-%m-%d"), "17:00"
             
-        # Trier les entrées par date décroissante
-        sorted_entries = sorted(self.entries, 
-                              key=lambda x: datetime.strptime(f"{x['start_date']} {x['start_time']}", "%Y-%m-%d %H:%M"),
-                              reverse=True)
-        
-        # Prendre la dernière entrée
-        last_entry = sorted_entries[0]
-        last_date = datetime.strptime(last_entry['start_date'], "%Y-%m-%d")
+        # Entrées les plus récentes (index chronologique)
+        sorted_positions = self.engine.entries.latest(5)
         
-        # Suggérer la date suivante
-        suggested_date = (last_date + timedelta(days=1)).strftime("%Y-%m-%d")
+        # Prendre la dernière entrée et suggérer la date suivante
+        last_start = self.engine.entries.starts[sorted_positions[0]]
+        suggested_date = format_date(last_start + 1440)
         
         # Calculer la moyenne des heures de début et de fin des 5 dernières entrées
-        start_times = []
-        end_times = []
-        
-        for entry in sorted_entries[:5]:
-            start = datetime.strptime(entry['start_time'], "%H:%M")
-            end = datetime.strptime(entry['end_time'], "%H:%M")
-            start_times.append(start)
-            end_times.append(end)
+        start_times = [self.engine.entries.starts[i] % 1440 for i in sorted_positions[:5]]
+        end_times = [self.engine.entries.ends[i] % 1440 for i in sorted_positions[:5]]
         
         # Calculer la moyenne
-        avg_start = sum((t.hour * 60 + t.minute for t in start_times), 0) / len(start_times)
-        avg_end = sum((t.hour * 60 + t.minute for t in end_times), 0) / len(end_times)
+        avg_start = sum(start_times) / len(start_times)
+        avg_end = sum(end_times) / len(end_times)
         
         # Convertir en format HH:MM
         suggested_start = f"{int(avg_start // 60):02d}:{int(avg_start % 60):02d}"
@@ -755,7 +936,7 @@ class WorkHoursApp:
         # Créer une nouvelle fenêtre pour ajouter une entrée
         entry_window = tk.Toplevel(self.root)
         entry_window.title("Nouvelle entrée")
-        entry_window.geometry("400x500")  # Augmenté la hauteur pour les nouveaux champs
+        entry_window.geometry("400x560")  # Augmenté la hauteur pour les nouveaux champs
         entry_window.configure(bg=self.get_theme_color('bg'))
         
         # Obtenir les dates et heures suggérées
@@ -771,6 +952,7 @@ class WorkHoursApp:
         break_start_min = tk.StringVar()
         break_end_hour = tk.StringVar()
         break_end_min = tk.StringVar()
+        extra_breaks = tk.StringVar()
         
         # Frame pour les champs
         fields_frame = tk.Frame(entry_window, bg=self.get_theme_color('bg'))
@@ -868,6 +1050,13 @@ class WorkHoursApp:
                                          width=3, state="readonly")
         break_end_min_combo.pack(side=tk.LEFT, padx=2)
         
+        # Pauses supplémentaires, y compris après minuit pour un travail de nuit
+        tk.Label(fields_frame, text="Autres pauses (HH:MM-HH:MM, ...):", bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(anchor=tk.W)
+        tk.Entry(fields_frame, textvariable=extra_breaks,
+                bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(fill=tk.X, pady=5)
+        
         # Cacher les champs de pause par défaut ou les afficher selon l'état initial
         if self.has_break.get():
             self.break_fields_frame.pack(fill=tk.X, pady=5)
@@ -882,7 +1071,8 @@ class WorkHoursApp:
                                                          break_start_hour.get(),
                                                          break_start_min.get(),
                                                          break_end_hour.get(),
-                                                         break_end_min.get()),
+                                                         break_end_min.get(),
+                                                         extra_breaks.get()),
                            bg=self.get_theme_color('button'),
                            fg=self.get_theme_color('button_fg'))
         save_btn.pack(pady=10)
@@ -891,18 +1081,17 @@ class WorkHoursApp:
         start_time_entry.focus_set()
 
     def save_entry(self, window, start_date, start_time, end_date, end_time,
-                  has_break, break_start_hour, break_start_min, break_end_hour, break_end_min):
-        print(f"Attempting to save entry with: start_date={start_date}, start_time={start_time}, end_date={end_date}, end_time={end_time}, has_break={has_break}, break_start_hour={break_start_hour}, break_start_min={break_start_min}, break_end_hour={break_end_hour}, break_end_min={break_end_min}")
+                  has_break, break_start_hour, break_start_min, break_end_hour, break_end_min,
+                  extra_breaks=''):
+        # Pause cochée : les quatre champs sont obligatoires
+        if has_break and not all(field.strip() for field in (break_start_hour, break_start_min,
+                                                             break_end_hour, break_end_min)):
+            messagebox.showerror("Erreur", "Heures de pause incomplètes : renseignez le début et la fin de la pause "
+                                           "ou décochez la case")
+            return
         try:
-            # Vérifier la durée avant de sauvegarder
-            is_valid, result = self.verify_duration(start_date, start_time, end_date, end_time)
-            if not is_valid:
-                messagebox.showerror("Erreur", result)
-                return
-            
-            # Créer la nouvelle entrée
+            # Créer la nouvelle entrée (l'ID permanent est attribué par le stockage)
             entry = {
-                'id': self.current_id,
                 'start_date': start_date,
                 'start_time': start_time,
                 'end_date': end_date,
@@ -915,61 +1104,86 @@ class WorkHoursApp:
                 'break_end_min': break_end_min
             }
             
-            # Ajouter l'entrée à la liste
-            self.entries.append(entry)
-            self.current_id += 1
-            
-            # Réorganiser les IDs après l'ajout
-            self.reorganize_ids()
+            # Liste des pauses : pause principale puis pauses supplémentaires, datées à partir du début
+            ranges = []
+            if has_break:
+                ranges.append((f"{break_start_hour}:{break_start_min}", f"{break_end_hour}:{break_end_min}"))
+            try:
+                ranges.extend(parse_break_ranges(extra_breaks))
+                if ranges:
+                    entry['breaks'] = anchor_breaks(start_date, start_time, ranges)
+            except ValueError as e:
+                messagebox.showerror("Erreur", str(e))
+                return
             
-            # Sauvegarder les données
-            self.save_data()
+            # Vérifier la durée et ajouter l'entrée au stockage
+            is_valid, result = self.engine.add_entry(entry)
+            if not is_valid:
+                messagebox.showerror("Erreur", result)
+                return
             
             # Fermer la fenêtre
             window.destroy()
             
-            # Mettre à jour les statistiques
-            self.show_statistics()
+            # Rafraîchir le tableau et les statistiques, puis sauvegarder
+            self.schedule('table', 'totals', 'chart', 'save')
             
             return True, result
             
         except ValueError as e:
-            print(f"verify_duration ValueError: {e}")
+            messagebox.showerror("Erreur", f"Format de date/heure invalide: {str(e)}")
             return False, f"Format de date/heure invalide: {str(e)}"
         except Exception as e:
-            print(f"verify_duration Exception: {e}")
+            messagebox.showerror("Erreur", f"Erreur lors de la vérification: {str(e)}")
             return False, f"Erreur lors de la vérification: {str(e)}"
 
+    def import_csv(self):
+        """Importe en lot les entrées d'un fichier CSV et affiche les lignes rejetées"""
+        filename = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not filename:
+            return
+        self.root.config(cursor="watch")
+        self.root.update_idletasks()
+        try:
+            count, rejected = self.engine.import_csv(filename)
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Erreur lors de l'import : {str(e)}")
+            return
+        finally:
+            self.root.config(cursor="")
+        
+        # L'instantané a déjà été réécrit par le moteur : pas de sauvegarde à demander
+        self.schedule('table', 'totals', 'chart')
+        
+        message = f"{count} entrée(s) importée(s)"
+        if rejected:
+            details = [f"Ligne {line}: {reason}" for line, reason in rejected[:20]]
+            if len(rejected) > 20:
+                details.append(f"... et {len(rejected) - 20} autre(s)")
+            message += f", {len(rejected)} ligne(s) rejetée(s) :\n\n" + "\n".join(details)
+            messagebox.showwarning("Import CSV", message)
+        else:
+            messagebox.showinfo("Import CSV", message)
+
     def delete_selected(self):
-        selected_items = self.tree.selection()
+        selected_items = self.selected_keys()
         if not selected_items:
             messagebox.showwarning("Attention", "Veuillez sélectionner une entrée à supprimer")
             return
             
         if messagebox.askyesno("Confirmation", "Voulez-vous vraiment supprimer les entrées sélectionnées ?"):
-            # Récupérer les IDs des entrées sélectionnées
-            selected_ids = [int(self.tree.item(item)['values'][0]) for item in selected_items]
-            
-            # Supprimer les entrées de la liste
-            self.entries = [entry for entry in self.entries if entry['id'] not in selected_ids]
+            # Supprimer les entrées sélectionnées
+            self.engine.entries.remove_keys(selected_items)
+            self._offscreen_selection.clear()
             
-            # Réorganiser les IDs après la suppression
-            self.reorganize_ids()
-            
-            # Sauvegarder les données
-            self.save_data()
-            
-            # Rafraîchir l'affichage
-            self.refresh_entries()
-            
-            # Mettre à jour les statistiques
-            self.show_statistics()
+            # Rafraîchir le tableau et les statistiques, puis sauvegarder
+            self.schedule('table', 'totals', 'chart', 'save')
 
     def show_export_options(self):
         """Affiche les options d'export avec sélection des colonnes"""
         export_window = tk.Toplevel(self.root)
         export_window.title("Options d'export")
-        export_window.geometry("400x500")
+        export_window.geometry("400x600")
         export_window.configure(bg=self.get_theme_color('bg'))
         
         # Frame pour les colonnes
@@ -1000,6 +1214,15 @@ class WorkHoursApp:
                           activebackground=self.get_theme_color('bg'),
                           activeforeground=self.get_theme_color('fg')).pack(anchor=tk.W, padx=5, pady=2)
         
+        # Résolution des images PNG (une image par page de lignes)
+        dpi_frame = tk.Frame(export_window, bg=self.get_theme_color('bg'))
+        dpi_frame.pack(fill=tk.X, padx=10)
+        tk.Label(dpi_frame, text="Résolution PNG (dpi) :", bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(side=tk.LEFT)
+        png_dpi = tk.IntVar(value=PNG_DPI)
+        tk.Spinbox(dpi_frame, from_=50, to=600, increment=50, textvariable=png_dpi,
+                  width=6).pack(side=tk.LEFT, padx=5)
+        
         # Frame pour les boutons
         buttons_frame = tk.Frame(export_window, bg=self.get_theme_color('bg'))
         buttons_frame.pack(fill=tk.X, padx=10, pady=10)
@@ -1011,251 +1234,317 @@ class WorkHoursApp:
                  fg=self.get_theme_color('button_fg')).pack(fill=tk.X, pady=5)
         
         tk.Button(buttons_frame, text="Exporter en PNG",
-                 command=lambda: self.export_png(columns_vars),
+                 command=lambda: self.export_png(columns_vars, png_dpi),
+                 bg=self.get_theme_color('button'),
+                 fg=self.get_theme_color('button_fg')).pack(fill=tk.X, pady=5)
+        
+        # Export Excel : une feuille par mois ou par catégorie
+        xlsx_frame = tk.Frame(buttons_frame, bg=self.get_theme_color('bg'))
+        xlsx_frame.pack(fill=tk.X, pady=5)
+        xlsx_group = tk.StringVar(value=XLSX_GROUPS[0])
+        tk.Label(xlsx_frame, text="Une feuille par :", bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(side=tk.LEFT)
+        ttk.Combobox(xlsx_frame, textvariable=xlsx_group, values=XLSX_GROUPS,
+                    state="readonly", width=10).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons_frame, text="Exporter en Excel",
+                 command=lambda: self.export_xlsx(columns_vars, xlsx_group),
                  bg=self.get_theme_color('button'),
                  fg=self.get_theme_color('button_fg')).pack(fill=tk.X, pady=5)
 
     def export_pdf(self, columns_vars):
         """Exporte les données en PDF avec les colonnes sélectionnées"""
+        self.export_file(columns_vars, ".pdf", "PDF files", "PDF", write_pdf)
+
+    def export_png(self, columns_vars, dpi_var):
+        """Exporte les données en images PNG (une par page) avec les colonnes sélectionnées"""
+        try:
+            dpi = int(dpi_var.get())
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Erreur", "La résolution doit être un nombre entier")
+            return
+        self.export_file(columns_vars, ".png", "PNG files", "PNG", write_png, dpi=dpi)
+
+    def export_xlsx(self, columns_vars, group_var):
+        """Exporte les données dans un classeur Excel avec les colonnes sélectionnées"""
+        self.export_file(columns_vars, ".xlsx", "Excel files", "Excel", write_xlsx,
+                         numeric=True, group_by=group_var.get())
+
+    def export_file(self, columns_vars, extension, file_type, label, writer, numeric=False, **options):
+        """Demande le nom du fichier puis écrit l'export avec writer dans un thread
+        
+        writer (voir work_hours_engine) reçoit progress et cancel en plus des options ;
+        numeric=True garde la durée et le montant en nombres (tableurs).
+        """
+        if self.export_thread is not None and self.export_thread.is_alive():
+            messagebox.showwarning("Attention", "Un export est déjà en cours")
+            return
         try:
-            from reportlab.lib import colors
-            from reportlab.lib.pagesizes import A4
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib.units import inch
-            
             # Demander le nom du fichier
             filename = filedialog.asksaveasfilename(
-                defaultextension=".pdf",
-                filetypes=[("PDF files", "*.pdf")],
-                title="Exporter en PDF"
+                defaultextension=extension,
+                filetypes=[(file_type, "*" + extension)],
+                title=f"Exporter en {label}"
             )
             
             if not filename:
                 return
             
-            # Créer le document
-            doc = SimpleDocTemplate(filename, pagesize=A4)
-            styles = getSampleStyleSheet()
-            elements = []
-            
-            # Titre
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                spaceAfter=30
-            )
-            elements.append(Paragraph("Rapport des heures travaillées", title_style))
-            elements.append(Spacer(1, 20))
-            
-            # Préparer les données du tableau
-            headers = []
-            for col, var in columns_vars.items():
-                if var.get():
-                    headers.append(col)
-            
-            data = [headers]
-            total_hours = 0.0
-            total_amount = 0.0
-            
-            for entry in self.entries:
-                duration = self.calculate_duration(entry)
-                amount = duration * self.hourly_rate.get()
-                total_hours += duration
-                total_amount += amount
-                
-                row = []
-                for col, var in columns_vars.items():
-                    if var.get():
-                        if col == 'ID':
-                            row.append(str(entry['id']))
-                        elif col == 'Date':
-                            row.append(entry['start_date'])
-                        elif col == 'Heure début':
-                            row.append(entry['start_time'])
-                        elif col == 'Début pause':
-                            row.append(f"{entry.get('break_start_hour', '')}:{entry.get('break_start_min', '')}" if entry.get('has_break') else '')
-                        elif col == 'Fin pause':
-                            row.append(f"{entry.get('break_end_hour', '')}:{entry.get('break_end_min', '')}" if entry.get('has_break') else '')
-                        elif col == 'Heure fin':
-                            row.append(entry['end_time'])
-                        elif col == 'Durée':
-                            row.append(f"{duration:.2f}")
-                        elif col == 'Catégorie':
-                            row.append(entry.get('category', ''))
-                        elif col == 'Montant':
-                            row.append(f"{amount:.2f} €")
-                data.append(row)
-            
-            # Ajouter les totaux
-            totals = [''] * len(headers)
-            if 'Durée' in headers:
-                totals[headers.index('Durée')] = f"{total_hours:.2f}"
-            if 'Montant' in headers:
-                totals[headers.index('Montant')] = f"{total_amount:.2f} €"
-            data.append(totals)
-            
-            # Créer le tableau
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 10),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-            
-            elements.append(table)
-            
-            # Générer le PDF
-            doc.build(elements)
-            
-            messagebox.showinfo("Succès", "Export PDF réussi !")
-            
+            # Lignes produites à la demande à partir d'une copie des entrées
+            columns = [col for col, var in columns_vars.items() if var.get()]
+            pipeline = self.engine.export_pipeline(columns, numeric)
         except Exception as e:
-            messagebox.showerror("Erreur", f"Erreur lors de l'export PDF : {str(e)}")
+            messagebox.showerror("Erreur", f"Erreur lors de l'export {label} : {str(e)}")
+            return
+        
+        self.export_cancel = threading.Event()
+        self.progress_var.set(0)
+        self.cancel_export_btn.pack(anchor=tk.E, padx=20, pady=(0, 5), after=self.progress_bar)
+        self.export_thread = threading.Thread(target=self.run_export, name="export", daemon=True,
+                                              args=(writer, label, filename, pipeline, self.export_cancel, options))
+        self.export_thread.start()
 
-    def export_png(self, columns_vars):
-        """Exporte les données en image PNG avec les colonnes sélectionnées"""
-        try:
-            # Demander le nom du fichier
-            filename = filedialog.asksaveasfilename(
-                defaultextension=".png",
-                filetypes=[("PNG files", "*.png")],
-                title="Exporter en PNG"
-            )
-            
-            if not filename:
+    def run_export(self, writer, label, filename, pipeline, cancel, options):
+        """Écrit l'export (thread d'export) ; l'interface est mise à jour par root.after"""
+        def progress(written, total):
+            # Export annulé (fermeture de la fenêtre...) : plus de mise à jour de l'interface
+            if cancel.is_set():
                 return
-            
-            # Créer une nouvelle figure
-            fig = Figure(figsize=(12, 8))
-            ax = fig.add_subplot(111)
-            
-            # Cacher les axes
-            ax.axis('off')
-            
-            # Préparer les données
-            headers = []
-            for col, var in columns_vars.items():
-                if var.get():
-                    headers.append(col)
-            
-            data = [headers]
-            total_hours = 0.0
-            total_amount = 0.0
-            
-            for entry in self.entries:
-                duration = self.calculate_duration(entry)
-                amount = duration * self.hourly_rate.get()
-                total_hours += duration
-                total_amount += amount
-                
-                row = []
-                for col, var in columns_vars.items():
-                    if var.get():
-                        if col == 'ID':
-                            row.append(str(entry['id']))
-                        elif col == 'Date':
-                            row.append(entry['start_date'])
-                        elif col == 'Heure début':
-                            row.append(entry['start_time'])
-                        elif col == 'Début pause':
-                            row.append(f"{entry.get('break_start_hour', '')}:{entry.get('break_start_min', '')}" if entry.get('has_break') else '')
-                        elif col == 'Fin pause':
-                            row.append(f"{entry.get('break_end_hour', '')}:{entry.get('break_end_min', '')}" if entry.get('has_break') else '')
-                        elif col == 'Heure fin':
-                            row.append(entry['end_time'])
-                        elif col == 'Durée':
-                            row.append(f"{duration:.2f}")
-                        elif col == 'Catégorie':
-                            row.append(entry.get('category', ''))
-                        elif col == 'Montant':
-                            row.append(f"{amount:.2f} €")
-                data.append(row)
-            
-            # Ajouter les totaux
-            totals = [''] * len(headers)
-            if 'Durée' in headers:
-                totals[headers.index('Durée')] = f"{total_hours:.2f}"
-            if 'Montant' in headers:
-                totals[headers.index('Montant')] = f"{total_amount:.2f} €"
-            data.append(totals)
-            
-            # Créer le tableau
-            table = ax.table(cellText=data,
-                           loc='center',
-                           cellLoc='center',
-                           colWidths=[0.1] * len(headers))
-            
-            # Styliser le tableau
-            table.auto_set_font_size(False)
-            table.set_fontsize(9)
-            table.scale(1.2, 1.5)
-            
-            # Ajouter un titre
-            ax.set_title("Rapport des heures travaillées", pad=20)
-            
-            # Sauvegarder l'image
-            fig.savefig(filename, bbox_inches='tight', dpi=300)
-            
-            messagebox.showinfo("Succès", "Export PNG réussi !")
-            
+            self.root.after(0, self.progress_var.set, 100 * written / total if total else 100)
+        
+        try:
+            writer(filename, pipeline, progress=progress, cancel=cancel, **options)
+        except ExportCancelled:
+            # Fichier incomplet supprimé (les pages PNG le sont par write_png)
+            if writer is not write_png and os.path.exists(filename):
+                os.remove(filename)
+            self.root.after(0, self.finish_export, f"Export {label} annulé", None)
         except Exception as e:
-            messagebox.showerror("Erreur", f"Erreur lors de l'export PNG : {str(e)}")
+            self.root.after(0, self.finish_export, None, f"Erreur lors de l'export {label} : {e}")
+        else:
+            self.root.after(0, self.finish_export, f"Export {label} réussi !", None)
+
+    def finish_export(self, message, error):
+        """Termine un export : masque l'annulation et affiche le résultat"""
+        if self.closing:
+            return
+        self.cancel_export_btn.pack_forget()
+        self.progress_var.set(0)
+        self.export_thread = None
+        if error:
+            messagebox.showerror("Erreur", error)
+        elif self.export_cancel.is_set():
+            messagebox.showinfo("Information", message)
+        else:
+            messagebox.showinfo("Succès", message)
+
+    def cancel_export(self):
+        """Demande l'arrêt de l'export en cours"""
+        if self.export_cancel is not None:
+            self.export_cancel.set()
 
     def update_totals(self):
         """Met à jour l'affichage des totaux"""
-        total_hours = 0.0
-        total_amount = 0.0
+        total_hours = self.engine.total_hours()
+        total_amount = self.engine.total_amount()
+        suffix = "" if self.engine.date_filter is None else " (période)"
         
-        for entry in self.entries:
-            duration = self.calculate_duration(entry)
-            total_hours += duration
-            total_amount += duration * self.hourly_rate.get()
+        self.total_hours_label.config(text=f"Total des heures{suffix}: {total_hours:.2f}")
+        self.total_amount_label.config(text=f"Total des gains{suffix}: {total_amount:.2f} €")
+
+    def format_row(self, entry, duration, amount):
+        """Retourne les valeurs affichées dans le tableau pour une entrée"""
+        breaks = entry['breaks']
+        return (
+            entry['id'],
+            entry['start_date'],
+            entry['start_time'],
+            ", ".join(start[11:] for start, _ in breaks),
+            ", ".join(end[11:] for _, end in breaks),
+            entry['end_time'],
+            f"{duration:.2f}",
+            entry.get('category', self.engine.categories[0]),
+            f"{amount:.2f}"
+        )
+
+    def apply_date_filter(self):
+        """Limite le tableau, les totaux, les graphiques et les exports à la période saisie"""
+        try:
+            self.engine.set_date_filter(self.filter_start.get(), self.filter_end.get())
+        except ValueError as e:
+            messagebox.showerror("Erreur", str(e))
+            return
         
-        self.total_hours_label.config(text=f"Total des heures: {total_hours:.2f}")
-        self.total_amount_label.config(text=f"Total des gains: {total_amount:.2f} €")
+        self._table_top = 0
+        self.schedule('table')
+        self.update_chart()
+
+    def clear_date_filter(self):
+        """Supprime le filtre par période"""
+        self.filter_start.set("")
+        self.filter_end.set("")
+        self.apply_date_filter()
+
+    def active_positions(self):
+        """Retourne les positions des entrées de la période filtrée (toutes sans filtre), par ordre chronologique"""
+        return self.engine.active_positions()
 
     def refresh_entries(self):
         """Rafraîchit l'affichage des entrées dans le tableau"""
-        # Effacer toutes les entrées existantes
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # Calculer en lot les durées et montants
+        hours, amounts, _ = compute_durations(self.engine.entries, self.engine.hourly_rate, self.engine.tariff)
+        self._table_hours = hours.tolist()
+        self._table_amounts = amounts.tolist()
+        
+        # Lignes à afficher : toutes les entrées ou celles de la période filtrée
+        if self.engine.date_filter is None:
+            self._table_keys = self.engine.entries.sorted_keys
+        else:
+            self._table_keys = self.engine.entries.overlapping(*self.engine.date_filter)
         
-        # Ajouter les entrées au tableau
-        for entry in self.entries:
+        # Au-delà du seuil, ne matérialiser que la fenêtre visible
+        self.virtual_table = len(self._table_keys) > VIRTUAL_TABLE_THRESHOLD
+        if self.virtual_table:
+            self.scroll_table_to(self._table_top)
+        else:
+            self.render_rows(0, len(self._table_keys))
+        
+        # Mettre à jour les totaux
+        self.update_totals()
+
+    def render_rows(self, start, stop):
+        """Affiche les lignes des rangs start à stop (exclu) de la liste chronologique affichée"""
+        # Construire les lignes attendues, identifiées par la clé stable de chaque entrée
+        order = []
+        rows = {}
+        for key in self._table_keys[start:stop]:
+            entry = EntryView(self.engine.entries, key)
+            position = self.engine.entries.index_of(key)
             try:
-                duration = self.calculate_duration(entry)
-                amount = duration * self.hourly_rate.get()
-                
-                self.tree.insert('', tk.END, values=(
-                    entry['id'],
-                    entry['start_date'],
-                    entry['start_time'],
-                    f"{entry.get('break_start_hour', '')}:{entry.get('break_start_min', '')}" if entry.get('has_break') else '',
-                    f"{entry.get('break_end_hour', '')}:{entry.get('break_end_min', '')}" if entry.get('has_break') else '',
-                    entry['end_time'],
-                    f"{duration:.2f}",
-                    entry.get('category', self.categories[0]),
-                    f"{amount:.2f}"
-                ))
+                iid = str(entry.key)
+                rows[iid] = self.format_row(entry, self._table_hours[position], self._table_amounts[position])
+                order.append(iid)
             except Exception as e:
                 print(f"Erreur lors de l'affichage de l'entrée {entry['id']}: {e}")
         
-        # Mettre à jour les totaux
-        self.update_totals()
+        # Conserver la sélection des lignes qui sortent de la fenêtre affichée
+        self._offscreen_selection.update(
+            iid for iid in self.tree.selection() if iid not in rows and int(iid) in self.engine.entries)
+        
+        # Appliquer uniquement les différences au tableau
+        self.sync_rows(order, rows)
+        
+        # Resélectionner les lignes qui reviennent dans la fenêtre
+        reselected = [iid for iid in order if iid in self._offscreen_selection]
+        if reselected:
+            self.tree.selection_add(reselected)
+            self._offscreen_selection.difference_update(reselected)
+
+    def visible_table_rows(self):
+        """Retourne le nombre de lignes visibles dans le tableau"""
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        return max(self.tree.winfo_height() // row_height, 10)
+
+    def scroll_table_to(self, top):
+        """Mode virtuel : matérialise la fenêtre de lignes commençant au rang top"""
+        count = len(self._table_keys)
+        visible = self.visible_table_rows()
+        top = max(0, min(int(top), count - visible))
+        start = max(0, top - TABLE_BUFFER_ROWS)
+        stop = min(count, top + visible + TABLE_BUFFER_ROWS)
+        self._table_top = top
+        self._table_window = (start, stop)
+        self.render_rows(start, stop)
+        if stop > start:
+            self.tree.yview_moveto((top - start) / (stop - start))
+
+    def on_table_scroll(self, *args):
+        """Commande de la barre de défilement"""
+        if not self.virtual_table:
+            self.tree.yview(*args)
+            return
+        
+        # Convertir la commande en position dans le tableau complet
+        if args[0] == 'moveto':
+            top = float(args[1]) * len(self._table_keys)
+        else:
+            step = self.visible_table_rows() if args[2] == 'pages' else 1
+            top = self._table_top + int(args[1]) * step
+        self.scroll_table_to(top)
+
+    def on_tree_yview(self, first, last):
+        """Reçoit la vue du tableau et met à jour la barre de défilement"""
+        if not self.virtual_table:
+            self.table_scrollbar.set(first, last)
+            return
+        
+        # Ramener la vue de la fenêtre à l'échelle du tableau complet
+        count = len(self._table_keys)
+        start, stop = self._table_window
+        top = start + float(first) * (stop - start)
+        bottom = start + float(last) * (stop - start)
+        self._table_top = int(top)
+        if count:
+            self.table_scrollbar.set(top / count, bottom / count)
+        
+        # Recharger la fenêtre quand la vue (clavier, molette) approche d'un bord non chargé
+        near_top = start > 0 and top - start < TABLE_BUFFER_ROWS / 2
+        near_bottom = stop < count and stop - bottom < TABLE_BUFFER_ROWS / 2
+        if (near_top or near_bottom) and not self._rewindow_pending:
+            self._rewindow_pending = True
+            self.root.after_idle(self.rewindow_table)
+
+    def rewindow_table(self):
+        """Recentre la fenêtre matérialisée sur la vue courante"""
+        self._rewindow_pending = False
+        if self.virtual_table:
+            self.scroll_table_to(self._table_top)
+
+    def on_tree_click(self, event):
+        """Un clic sans Ctrl ni Maj remplace aussi la sélection hors de la fenêtre affichée"""
+        if not event.state & 0x0005:
+            self._offscreen_selection.clear()
+
+    def selected_keys(self):
+        """Retourne les clés des entrées sélectionnées, y compris hors de la fenêtre affichée"""
+        selected = set(self.tree.selection()) | self._offscreen_selection
+        return [int(iid) for iid in selected if int(iid) in self.engine.entries]
+
+    def sync_rows(self, order, rows):
+        """Applique au tableau les insertions, modifications et suppressions nécessaires
+        
+        La sélection et la position de défilement sont conservées pour les lignes inchangées.
+        """
+        # Supprimer les lignes qui n'existent plus
+        stale = [iid for iid in self._rendered_rows if iid not in rows]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self._rendered_rows[iid]
+        
+        # Insérer les nouvelles lignes et mettre à jour celles qui ont changé
+        for position, iid in enumerate(order):
+            values = rows[iid]
+            rendered = self._rendered_rows.get(iid)
+            if rendered is None:
+                self.tree.insert('', position, iid=iid, values=values)
+            elif rendered != values:
+                self.tree.item(iid, values=values)
+            self._rendered_rows[iid] = values
+        
+        # Rétablir l'ordre des lignes uniquement s'il a changé, en déplaçant le moins de lignes possible
+        children = self.tree.get_children()
+        if list(children) != order:
+            rank = {iid: i for i, iid in enumerate(order)}
+            kept = longest_increasing_subsequence([rank[iid] for iid in children])
+            for position, iid in enumerate(order):
+                if position not in kept:
+                    # Placer la ligne juste après celle qui la précède dans l'ordre voulu
+                    index = self.tree.index(order[position - 1]) + 1 if position else 0
+                    self.tree.move(iid, '', index)
 
     def edit_selected(self):
         """Modifie l'entrée sélectionnée"""
-        selected_items = self.tree.selection()
+        selected_items = self.selected_keys()
         if not selected_items:
             messagebox.showwarning("Attention", "Veuillez sélectionner une entrée à modifier")
             return
@@ -1264,11 +1553,12 @@ class WorkHoursApp:
             messagebox.showwarning("Attention", "Veuillez sélectionner une seule entrée à modifier")
             return
             
-        # Récupérer l'ID de l'entrée sélectionnée
-        selected_id = int(self.tree.item(selected_items[0])['values'][0])
-        
         # Trouver l'entrée correspondante
-        entry = next((e for e in self.entries if e['id'] == selected_id), None)
+        selected_key = selected_items[0]
+        if selected_key in self.engine.entries:
+            entry = EntryView(self.engine.entries, selected_key)
+        else:
+            entry = None
         if not entry:
             messagebox.showerror("Erreur", "Entrée non trouvée")
             return
@@ -1276,7 +1566,7 @@ class WorkHoursApp:
         # Créer une nouvelle fenêtre pour modifier l'entrée
         edit_window = tk.Toplevel(self.root)
         edit_window.title("Modifier l'entrée")
-        edit_window.geometry("400x400")
+        edit_window.geometry("400x460")
         edit_window.configure(bg=self.get_theme_color('bg'))
         
         # Variables pour les champs
@@ -1284,7 +1574,8 @@ class WorkHoursApp:
         start_time = tk.StringVar(value=entry['start_time'])
         end_date = tk.StringVar(value=entry['end_date'])
         end_time = tk.StringVar(value=entry['end_time'])
-        category = tk.StringVar(value=entry.get('category', self.categories[0]))
+        category = tk.StringVar(value=entry.get('category', self.engine.categories[0]))
+        breaks = tk.StringVar(value=", ".join(f"{start[11:]}-{end[11:]}" for start, end in entry['breaks']))
         
         # Frame pour les champs
         fields_frame = tk.Frame(edit_window, bg=self.get_theme_color('bg'))
@@ -1323,14 +1614,21 @@ class WorkHoursApp:
         tk.Label(fields_frame, text="Catégorie:", bg=self.get_theme_color('bg'),
                 fg=self.get_theme_color('fg')).pack(anchor=tk.W)
         category_combo = ttk.Combobox(fields_frame, textvariable=category,
-                                    values=self.categories, state="readonly")
+                                    values=self.engine.categories, state="readonly")
         category_combo.pack(fill=tk.X, pady=5)
         
+        # Pauses, y compris après minuit pour un travail de nuit
+        tk.Label(fields_frame, text="Pauses (HH:MM-HH:MM, ...):", bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(anchor=tk.W)
+        tk.Entry(fields_frame, textvariable=breaks,
+                bg=self.get_theme_color('bg'),
+                fg=self.get_theme_color('fg')).pack(fill=tk.X, pady=5)
+        
         # Bouton de sauvegarde
         save_btn = tk.Button(edit_window, text="Enregistrer",
                            command=lambda: self.save_edit(edit_window, entry, start_date.get(),
                                                         start_time.get(), end_date.get(),
-                                                        end_time.get(), category.get()),
+                                                        end_time.get(), category.get(), breaks.get()),
                            bg=self.get_theme_color('button'),
                            fg=self.get_theme_color('button_fg'))
         save_btn.pack(pady=10)
@@ -1338,125 +1636,135 @@ class WorkHoursApp:
         # Mettre le focus sur le champ de l'heure de début
         start_time_entry.focus_set()
 
-    def save_edit(self, window, entry, start_date, start_time, end_date, end_time, category):
+    def save_edit(self, window, entry, start_date, start_time, end_date, end_time, category, breaks=None):
         """Sauvegarde les modifications d'une entrée"""
         try:
-            # Vérifier la durée avant de sauvegarder
-            is_valid, result = self.verify_duration(start_date, start_time, end_date, end_time)
+            fields = {
+                'start_date': start_date,
+                'start_time': start_time,
+                'end_date': end_date,
+                'end_time': end_time,
+                'category': category
+            }
+            if breaks is not None:
+                try:
+                    fields['breaks'] = anchor_breaks(start_date, start_time, parse_break_ranges(breaks))
+                except ValueError as e:
+                    messagebox.showerror("Erreur", str(e))
+                    return
+            
+            # Vérifier la durée puis mettre à jour l'entrée (la durée est recalculée par le stockage)
+            is_valid, result = self.engine.edit_entry(entry.key, fields)
             if not is_valid:
                 messagebox.showerror("Erreur", result)
                 return
             
-            # Mettre à jour l'entrée
-            entry['start_date'] = start_date
-            entry['start_time'] = start_time
-            entry['end_date'] = end_date
-            entry['end_time'] = end_time
-            entry['category'] = category
-            
-            # Réorganiser les IDs après la modification
-            self.reorganize_ids()
-            
-            # Sauvegarder les données
-            self.save_data()
-            
             # Fermer la fenêtre
             window.destroy()
             
-            # Rafraîchir l'affichage
-            self.refresh_entries()
-            
-            # Mettre à jour les statistiques
-            self.show_statistics()
+            # Rafraîchir le tableau et les statistiques, puis sauvegarder
+            self.schedule('table', 'totals', 'chart', 'save')
             
         except ValueError:
             messagebox.showerror("Erreur", "Format de date ou d'heure invalide")
 
-    def reorganize_ids(self):
-        """Réorganise les IDs des entrées pour s'assurer qu'ils sont séquentiels"""
-        try:
-            # Trier les entrées par date et heure de début
-            sorted_entries = sorted(self.entries, 
-                                  key=lambda x: datetime.strptime(f"{x['start_date']} {x['start_time']}", "%Y-%m-%d %H:%M"))
-            
-            # Réassigner les IDs
-            for i, entry in enumerate(sorted_entries):
-                entry['id'] = i
-            
-            # Mettre à jour l'ID courant
-            self.current_id = len(sorted_entries)
-            
-            # Sauvegarder les modifications
-            self.save_data()
-            
-            # Rafraîchir l'affichage
-            self.refresh_entries()
-            
-            return True
-        except Exception as e:
-            print(f"Erreur lors de la réorganisation des IDs: {e}")
-            return False
-
     def check_all_durations(self):
-        """Vérifie toutes les durées et affiche un rapport détaillé"""
-        issues = []
-        total_duration = 0.0
+        """Vérifie toutes les durées et les chevauchements et affiche les problèmes dans un tableau"""
+        total_duration, issues = self.engine.duration_issues()
         
-        for entry in self.entries:
-            try:
-                # Calculer la durée brute
-                start = datetime.strptime(f"{entry['start_date']} {entry['start_time']}", "%Y-%m-%d %H:%M")
-                end = datetime.strptime(f"{entry['end_date']} {entry['end_time']}", "%Y-%m-%d %H:%M")
-                raw_duration = (end - start).total_seconds() / 3600
-                
-                # Calculer la durée avec pauses
-                final_duration = self.calculate_duration(entry)
-                
-                # Vérifier les problèmes potentiels
-                if raw_duration <= 0:
-                    issues.append(f"Entrée {entry['id']}: Durée brute invalide ({raw_duration:.2f}h)")
-                elif raw_duration > 24:
-                    issues.append(f"Entrée {entry['id']}: Durée brute supérieure à 24h ({raw_duration:.2f}h)")
-                elif final_duration <= 0:
-                    issues.append(f"Entrée {entry['id']}: Durée finale nulle ou négative ({final_duration:.2f}h)")
-                elif abs(final_duration - raw_duration) > 2:  # Si la différence est supérieure à 2h
-                    issues.append(f"Entrée {entry['id']}: Grande différence entre durée brute ({raw_duration:.2f}h) et finale ({final_duration:.2f}h)")
-                
-                total_duration += final_duration
-                
-            except Exception as e:
-                issues.append(f"Entrée {entry['id']}: Erreur lors de la vérification - {str(e)}")
+        if not issues:
+            messagebox.showinfo("Vérification des durées",
+                                f"Total des heures: {total_duration:.2f}h\n\nAucun problème détecté dans les durées.")
+            return
         
-        # Préparer le message
-        message = f"Total des heures: {total_duration:.2f}h\n\n"
+        window = tk.Toplevel(self.root)
+        window.title("Vérification des durées")
+        window.geometry("750x450")
+        window.configure(bg=self.get_theme_color('bg'))
+        tk.Label(window, text=f"Total des heures: {total_duration:.2f}h - {len(issues)} problème(s) détecté(s)",
+                bg=self.get_theme_color('bg'), fg=self.get_theme_color('fg')).pack(pady=5)
+        
+        # Tableau des problèmes : tri par clic sur un en-tête, affichage par pages
+        table_frame = tk.Frame(window, bg=self.get_theme_color('bg'))
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        columns = ('id', 'date', 'problème', 'détail')
+        tree = ttk.Treeview(table_frame, columns=columns, show='headings', selectmode='browse')
+        tree.column('id', width=60)
+        tree.column('date', width=130)
+        tree.column('problème', width=120)
+        tree.column('détail', width=400)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        if issues:
-            message += "Problèmes détectés:\n\n" + "\n".join(issues)
-            messagebox.showwarning("Vérification des durées", message)
-        else:
-            message += "Aucun problème détecté dans les durées."
-            messagebox.showinfo("Vérification des durées", message)
+        pages_frame = tk.Frame(window, bg=self.get_theme_color('bg'))
+        pages_frame.pack(pady=5)
+        page_label = tk.Label(pages_frame, bg=self.get_theme_color('bg'), fg=self.get_theme_color('fg'))
+        
+        # Colonne du tuple (clé, ID, début, type, détail) servant au tri de chaque colonne affichée
+        sort_fields = {'id': 1, 'date': 2, 'problème': 3, 'détail': 4}
+        state = {'page': 0, 'column': 'date', 'reverse': False}
+        
+        def show_page(page):
+            pages = max((len(issues) - 1) // ISSUES_PAGE_ROWS + 1, 1)
+            state['page'] = page = max(0, min(page, pages - 1))
+            tree.delete(*tree.get_children())
+            first = page * ISSUES_PAGE_ROWS
+            for key, entry_id, start, kind, detail in issues[first:first + ISSUES_PAGE_ROWS]:
+                tree.insert('', tk.END, iid=str(key) + ':' + kind,
+                            values=(entry_id, f"{format_date(start)} {format_time(start)}", kind, detail))
+            page_label.config(text=f"{first + 1}-{min(first + ISSUES_PAGE_ROWS, len(issues))} sur {len(issues)}")
+        
+        def sort_by(column):
+            state['reverse'] = not state['reverse'] if state['column'] == column else False
+            state['column'] = column
+            field = sort_fields[column]
+            issues.sort(key=lambda issue: issue[field], reverse=state['reverse'])
+            show_page(0)
+        
+        for column, text in zip(columns, ('ID', 'Date', 'Problème', 'Détail')):
+            tree.heading(column, text=text, command=lambda column=column: sort_by(column))
+        
+        tk.Button(pages_frame, text="◀", command=lambda: show_page(state['page'] - 1),
+                 bg=self.get_theme_color('button'), fg=self.get_theme_color('button_fg')).pack(side=tk.LEFT)
+        page_label.pack(side=tk.LEFT, padx=10)
+        tk.Button(pages_frame, text="▶", command=lambda: show_page(state['page'] + 1),
+                 bg=self.get_theme_color('button'), fg=self.get_theme_color('button_fg')).pack(side=tk.LEFT)
+        
+        # Un clic sur un problème sélectionne l'entrée correspondante dans le tableau principal
+        tree.bind('<<TreeviewSelect>>',
+                  lambda e: [self.select_entry(int(iid.split(':')[0])) for iid in tree.selection()])
+        show_page(0)
+
+    def select_entry(self, key):
+        """Sélectionne et fait défiler jusqu'à l'entrée key dans le tableau principal"""
+        try:
+            rank = self._table_keys.index(key)
+        except ValueError:
+            messagebox.showinfo("Information", "Cette entrée est hors de la période filtrée", parent=self.root)
+            return
+        self.notebook.select(0)
+        if self.virtual_table:
+            self.scroll_table_to(rank - self.visible_table_rows() // 2)
+        self._offscreen_selection.clear()
+        iid = str(key)
+        self.tree.selection_set(iid)
+        self.tree.see(iid)
 
     def clear_all_entries(self):
         """Vide toutes les entrées du tableau après confirmation"""
-        if not self.entries:
+        if not self.engine.entries:
             messagebox.showinfo("Information", "Le tableau est déjà vide")
             return
             
         if messagebox.askyesno("Confirmation", 
                               "Êtes-vous sûr de vouloir supprimer toutes les entrées ?\nCette action est irréversible."):
             # Vider la liste des entrées
-            self.entries = []
-            self.current_id = 0
-            
-            # Sauvegarder les données
-            self.save_data()
-            
-            # Rafraîchir l'affichage
-            self.refresh_entries()
+            self.engine.entries.clear()
             
-            # Mettre à jour les statistiques
-            self.show_statistics()
+            # Rafraîchir le tableau et les statistiques, puis sauvegarder
+            self.schedule('table', 'totals', 'chart', 'save')
             
             messagebox.showinfo("Succès", "Toutes les entrées ont été supprimées")
 